@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+HOG人物検出のベンチマーク
+従来の設定（accurate: 元の解像度）と、縮小して検出する設定（balanced / fast）の
+1枚あたりの時間と、従来の設定で見つかった人物をどれだけ検出できたかを比較する
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import codespaces_ml_intro as ml
+
+
+def match_rate(baseline, detections, iou_threshold=0.5):
+    """baseline の枠のうち、detections に IoU が閾値以上の枠がある割合"""
+    if not baseline:
+        return None
+    matched = sum(
+        1 for base in baseline
+        if any(ml.box_iou(base['bbox'], d['bbox']) >= iou_threshold for d in detections)
+    )
+    return matched / len(baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HOG人物検出の設定ごとの速度比較")
+    parser.add_argument("images", nargs='+', help="画像ファイル・ディレクトリ・globパターン")
+    parser.add_argument("--presets", default=",".join(ml.HOG_PRESETS),
+                        help=f"比較する設定（カンマ区切り） (default: {','.join(ml.HOG_PRESETS)})")
+    parser.add_argument("--roi", type=ml.parse_roi, default=None,
+                        help="縮小する設定で使う検出範囲 x1,y1,x2,y2")
+    parser.add_argument("--repeat", type=int, default=1, help="1枚あたりの繰り返し回数 (default: 1)")
+    args = parser.parse_args()
+
+    image_paths = ml.resolve_image_paths(args.images)
+    if not image_paths:
+        print("❌ 画像ファイルがありません")
+        sys.exit(1)
+    presets = args.presets.split(',')
+    # 基準は常に従来の設定（範囲指定なし）
+    if 'accurate' not in presets:
+        presets.insert(0, 'accurate')
+
+    frames = [ml.load_frame(path) for path in image_paths]
+    ml.get_hog_detector()
+    sizes = sorted({f"{f.rgb.shape[1]}x{f.rgb.shape[0]}" for f in frames})
+    print(f"画像: {len(frames)}枚（{', '.join(sizes)}） / 繰り返し: {args.repeat}回\n")
+
+    seconds = {}
+    detections = {}
+    for preset in presets:
+        roi = None if preset == 'accurate' else args.roi
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            detections[preset] = [ml.detect_people_hog(f.rgb, preset, roi) for f in frames]
+        seconds[preset] = (time.perf_counter() - start) / (args.repeat * len(frames))
+
+    print(f"{'設定':10} {'ms/枚':>10} {'速度':>8} {'検出数':>8} {'従来との一致':>12}")
+    for preset in presets:
+        rates = [
+            match_rate(base, found)
+            for base, found in zip(detections['accurate'], detections[preset])
+        ]
+        rates = [r for r in rates if r is not None]
+        rate = f"{sum(rates) / len(rates) * 100:.0f}%" if rates else "-"
+        count = sum(len(d) for d in detections[preset])
+        print(f"{preset:10} {seconds[preset] * 1000:10.1f} "
+              f"{seconds['accurate'] / seconds[preset]:7.1f}x {count:8d} {rate:>12}")
+    print("\n従来との一致: 従来の設定で検出した人物のうち、IoU 0.5以上の枠で検出できた割合")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,16 @@ pip install tensorflow pillow matplotlib opencv-python ultralytics
 
 import os
 import sys
+import csv
+import glob
+import json
+import time
+import queue
 import argparse
+import threading
+import weakref
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # GUI無し環境用
@@ -30,6 +39,113 @@ import cv2
 # YOLO
 from ultralytics import YOLO
 
+# 共通ユーティリティ（codespaces/utils）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.tiling import tile_positions, nms
+
+# ディレクトリ指定時に処理する画像の拡張子
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# 動画として処理するファイルの拡張子
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v')
+
+# 1枚の画像の各色空間（検出器ごとに読み込み・変換し直さないよう1度だけ作る）
+Frame = namedtuple('Frame', ['bgr', 'rgb', 'gray'])
+
+# 読み込み済みモデルのキャッシュ（プロセス内で各モデルを1度だけ読み込む）
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+# モデルごとのロック（YOLOの読み込み中に他のモデルの取得まで待たされないように）
+_model_locks = {}
+# 特徴マップ用のモデル（元のモデル → {層の名前の組: モデル}）。
+# id() ではなくモデル自体をキーにし、元のモデルが解放されたら一緒に消えるようにする
+_activation_models = weakref.WeakKeyDictionary()
+
+
+def get_cached_model(key, loader):
+    """key のモデルを初回だけ loader() で読み込み、以降は同じインスタンスを返す"""
+    with _model_cache_lock:
+        lock = _model_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _model_cache:
+            _model_cache[key] = loader()
+        return _model_cache[key]
+
+
+def get_vgg16_model():
+    """ImageNetで学習済みのVGG16（初回のみ読み込み）"""
+    def load():
+        print("モデルを読み込んでいます...")
+        model = VGG16(weights='imagenet')
+        print("準備完了！")
+        return model
+    return get_cached_model('vgg16', load)
+
+
+def get_yolo_model(weights='yolov8n.pt'):
+    """YOLOv8モデル（初回のみ読み込み。初回は自動ダウンロード）"""
+    def load():
+        print("YOLOモデルをロード中...")
+        return YOLO(weights)
+    return get_cached_model(('yolo', weights), load)
+
+
+def get_hog_detector():
+    """人物検出用のHOG記述子（初回のみ初期化）"""
+    def load():
+        hog = cv2.HOGDescriptor()
+        hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        return hog
+    return get_cached_model('hog', load)
+
+
+def get_face_cascade():
+    """顔検出用のカスケード分類器（初回のみ読み込み）"""
+    return get_cached_model(
+        'face_cascade',
+        lambda: cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    )
+
+
+def list_image_files(image_dir):
+    """ディレクトリ内の画像ファイルのパス（名前順）"""
+    return [
+        os.path.join(image_dir, f) for f in sorted(os.listdir(image_dir))
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def resolve_image_paths(inputs):
+    """コマンドラインで指定された画像・ディレクトリ・globパターンを画像ファイルのリストに展開"""
+    image_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            image_paths.extend(list_image_files(path))
+        elif glob.has_magic(path) and not is_stream_url(path):
+            image_paths.extend(
+                p for p in sorted(glob.glob(path, recursive=True))
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+def make_frame(image_bgr):
+    """BGR画像（cv2.imreadの結果）からRGB・グレースケールを1度だけ作って Frame にまとめる"""
+    return Frame(
+        bgr=image_bgr,
+        rgb=cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB),
+        gray=cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+    )
+
+
+def load_frame(image_path):
+    """画像ファイルを1度だけデコードして Frame を返す"""
+    image_bgr = cv2.imread(image_path)
+    if image_bgr is None:
+        raise ValueError(f"画像を読み込めません: {image_path}")
+    return make_frame(image_bgr)
+
 
 def print_section(title):
     """セクションヘッダーを表示"""
@@ -47,10 +163,8 @@ def vgg16_image_classification(image_path, output_dir=None):
         output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
     os.makedirs(output_dir, exist_ok=True)
     
-    # モデルを読み込む
-    print("モデルを読み込んでいます...")
-    model = VGG16(weights='imagenet')
-    print("準備完了！")
+    # モデルを読み込む（2回目以降は読み込み済みのモデルを再利用）
+    model = get_vgg16_model()
     
     # 画像を読み込んで前処理
     print(f"画像 '{image_path}' を読み込んでいます...")
@@ -98,8 +212,29 @@ def vgg16_image_classification(image_path, output_dir=None):
     return model, img_array, results
 
 
-def visualize_feature_maps(model, img_array, output_dir=None):
-    """特徴マップの可視化"""
+def get_activation_model(model, layer_names):
+    """model の指定した層の出力を返すモデル（モデルと層の組ごとに1度だけ作る）
+
+    指定した層より後ろは計算されないため、浅い層だけなら推論も軽い。
+    """
+    layer_names = tuple(layer_names)
+    with _model_cache_lock:
+        models = _activation_models.setdefault(model, {})
+        if layer_names not in models:
+            models[layer_names] = Model(inputs=model.input,
+                                        outputs=[model.get_layer(name).output for name in layer_names])
+        return models[layer_names]
+
+
+def visualize_feature_maps(model, img_array, output_dir=None, layers=(1,), num_maps=8,
+                           image_names=None):
+    """特徴マップの可視化
+
+    layers: 表示する層（層の名前または model.layers のインデックス。既定は最初の畳み込み層）
+        出力が (N, H, W, C) の層だけが対象で、全結合層など画像の形をしていない層は飛ばす
+    img_array: 前処理済みの画像 (N, 224, 224, 3)。複数枚をまとめて1回で計算する
+    戻り値: {層の名前: 特徴マップ (N, H, W, C)}
+    """
     print_section("特徴マップの可視化")
     
     # 出力ディレクトリを設定
@@ -107,33 +242,162 @@ def visualize_feature_maps(model, img_array, output_dir=None):
         output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
     os.makedirs(output_dir, exist_ok=True)
     
-    # 最初の畳み込み層の出力を取得
-    layer_outputs = [layer.output for layer in model.layers[1:6]]
-    activation_model = Model(inputs=model.input, outputs=layer_outputs)
+    # 指定した層の出力だけを計算するモデル（2回目以降は作成済みのものを再利用）
+    layer_names = []
+    for layer in layers:
+        try:
+            target = model.layers[layer] if isinstance(layer, int) else model.get_layer(layer)
+        except (IndexError, ValueError):
+            print(f"⚠️  層 {layer} はありません（{len(model.layers)}層: 0〜{len(model.layers) - 1}）")
+            continue
+        if len(target.output.shape) != 4:
+            print(f"⚠️  層 {target.name} の出力は特徴マップ（縦×横×チャンネル）ではないため飛ばします"
+                  f"（出力の形: {tuple(target.output.shape)}）")
+            continue
+        layer_names.append(target.name)
+    if not layer_names:
+        print("⚠️  表示できる層がありません（block1_conv1 などの畳み込み層を指定してください）")
+        return {}
+    activation_model = get_activation_model(model, layer_names)
     
-    # 特徴マップを計算
+    # 特徴マップを計算（全画像・全層をまとめて1回で）
     activations = activation_model.predict(img_array)
+    if len(layer_names) == 1:
+        activations = [activations]
+    activations = dict(zip(layer_names, activations))
     
-    # 最初の層の特徴マップを表示
-    first_layer_activation = activations[0]
-    plt.figure(figsize=(15, 8))
+    num_images = len(img_array)
+    if image_names is None:
+        image_names = [f'画像{i+1}' for i in range(num_images)]
     
-    # 8個の特徴マップを表示
-    for i in range(8):
-        plt.subplot(2, 4, i + 1)
-        plt.imshow(first_layer_activation[0, :, :, i], cmap='viridis')
-        plt.title(f'特徴マップ {i+1}')
-        plt.axis('off')
+    for layer_name, activation in activations.items():
+        count = min(num_maps, activation.shape[-1])
+        if num_images == 1:
+            # 1枚のときは2段に並べる
+            rows, cols = 2, (count + 1) // 2
+            plt.figure(figsize=(15, 8))
+        else:
+            # 複数枚のときは画像ごとに1行
+            rows, cols = num_images, count
+            plt.figure(figsize=(2 * count, 2 * num_images + 1))
+        
+        for n in range(num_images):
+            for i in range(count):
+                plt.subplot(rows, cols, n * count + i + 1)
+                plt.imshow(activation[n, :, :, i], cmap='viridis')
+                if num_images == 1:
+                    plt.title(f'特徴マップ {i+1}')
+                elif i == 0:
+                    plt.title(image_names[n], loc='left')
+                plt.axis('off')
+        
+        is_first = layer_name == model.layers[1].name
+        plt.suptitle(f"AIが見ている特徴（{'最初の層' if is_first else layer_name}）")
+        # 最初の層はこれまでどおり feature_maps.png に保存
+        filename = "feature_maps.png" if is_first else f"feature_maps_{layer_name}.png"
+        output_path = os.path.join(output_dir, filename)
+        plt.savefig(output_path)
+        plt.close()
+        print(f"特徴マップを保存しました: {output_path}")
     
-    plt.suptitle('AIが見ている特徴（最初の層）')
-    output_path = os.path.join(output_dir, "feature_maps.png")
-    plt.savefig(output_path)
-    plt.close()
-    print(f"特徴マップを保存しました: {output_path}")
+    return activations
+
+
+# YOLOの検出結果を1件1行で持つ構造化配列の型（クラスID・信頼度・枠 x1, y1, x2, y2）
+DETECTION_DTYPE = np.dtype([
+    ('class_id', np.int16),
+    ('confidence', np.float32),
+    ('bbox', np.int32, (4,)),
+])
+
+
+def extract_detections(result, classes=(0,), conf_threshold=0.5):
+    """YOLOの1枚分の推論結果から、指定したクラスで信頼度が閾値を超える検出を構造化配列で取り出す
+
+    boxes.cls / boxes.conf / boxes.xyxy をそれぞれ1回だけnumpy配列に変換し、マスクでまとめて絞り込む
+    （枠ごとにテンソルから値を取り出さない）。classes=None なら全クラスを対象にする。
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros(0, dtype=DETECTION_DTYPE)
+    
+    class_ids = boxes.cls.cpu().numpy().astype(np.int16)
+    confidences = boxes.conf.cpu().numpy().astype(np.float32)
+    xyxy = boxes.xyxy.cpu().numpy()
+    
+    mask = confidences > conf_threshold
+    if classes is not None:
+        mask &= np.isin(class_ids, classes)
+    
+    detections = np.zeros(int(mask.sum()), dtype=DETECTION_DTYPE)
+    detections['class_id'] = class_ids[mask]
+    detections['confidence'] = confidences[mask]
+    detections['bbox'] = xyxy[mask].astype(np.int32)
+    return detections
+
+
+def detections_to_dicts(detections):
+    """構造化配列の検出結果を {'bbox', 'confidence'} の辞書のリストに変換（描画・JSON出力用）"""
+    return [
+        {'bbox': tuple(bbox), 'confidence': confidence}
+        for bbox, confidence in zip(detections['bbox'].tolist(), detections['confidence'].tolist())
+    ]
+
+
+def extract_person_detections(result, conf_threshold=0.5, classes=(0,)):
+    """YOLOの1枚分の推論結果から人物（クラス0）の検出結果を辞書のリストで取り出す"""
+    return detections_to_dicts(extract_detections(result, classes, conf_threshold))
 
 
-def yolo_person_detection(image_path, output_dir=None):
-    """YOLOv8を使った人物検出"""
+def detect_people_yolo(image_bgr, conf_threshold=0.5, classes=(0,), tile_size=None, tile_overlap=0.2):
+    """YOLOv8でBGR画像から人物（classes で他のクラスも指定可）を検出し、検出結果のリストを返す
+
+    tile_size を指定すると detect_people_yolo_tiled でタイルに分けて検出する。
+    """
+    if tile_size:
+        return detect_people_yolo_tiled(image_bgr, tile_size, tile_overlap,
+                                        conf_threshold=conf_threshold, classes=classes)
+    model = get_yolo_model('yolov8n.pt')
+    # デコード済みのBGR配列を渡し、YOLO側でファイルを読み直さない
+    person_detections = []
+    for r in model(image_bgr):
+        person_detections.extend(extract_person_detections(r, conf_threshold, classes))
+    return person_detections
+
+
+def detect_people_yolo_tiled(image_bgr, tile_size=640, overlap=0.2, batch_size=16,
+                             conf_threshold=0.5, classes=(0,), iou_threshold=0.5):
+    """高解像度のBGR画像を重なりのあるタイルに分けてYOLOで検出し、検出結果のリストを返す
+
+    画像全体を640pxに縮小すると小さく写った物体が数ピクセルになって見逃されるため、
+    元の解像度のタイルを batch_size 枚ずつまとめて推論する。各タイルの枠を画像全体の座標に戻し、
+    タイルの重なりで二重に検出された枠はクラスごとのNMSで1つにまとめる。
+    """
+    model = get_yolo_model('yolov8n.pt')
+    height, width = image_bgr.shape[:2]
+    positions = tile_positions(width, height, tile_size, overlap)
+    
+    found = []
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        tiles = [image_bgr[y1:y2, x1:x2] for x1, y1, x2, y2 in chunk]
+        for (x1, y1, _, _), r in zip(chunk, model(tiles, verbose=False)):
+            detections = extract_detections(r, classes, conf_threshold)
+            detections['bbox'] += np.array([x1, y1, x1, y1], dtype=np.int32)
+            found.append(detections)
+    detections = np.concatenate(found) if found else np.zeros(0, dtype=DETECTION_DTYPE)
+    
+    # 別のクラスの枠どうしは重ならないよう、クラスごとに座標をずらしてから1回でNMSする
+    offsets = detections['class_id'].astype(np.int64)[:, None] * (max(width, height) + 1)
+    keep = nms(detections['bbox'] + offsets, detections['confidence'], iou_threshold)
+    return detections_to_dicts(detections[keep])
+
+
+def yolo_person_detection(image_path, output_dir=None, frame=None, detections=None):
+    """YOLOv8を使った人物検出
+
+    frame を渡すとファイルを読み込み直さず、detections（検出済みの結果）を渡すと描画と保存だけを行う。
+    """
     print_section("YOLO人物検出")
     
     # 出力ディレクトリを設定
@@ -141,33 +405,14 @@ def yolo_person_detection(image_path, output_dir=None):
         output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
     os.makedirs(output_dir, exist_ok=True)
     
-    # YOLOv8モデルをロード（初回は自動ダウンロード）
-    print("YOLOモデルをロード中...")
-    model = YOLO('yolov8n.pt')  # nano版（軽量）
-    
     # 画像を読み込み
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if frame is None:
+        frame = load_frame(image_path)
+    image_rgb = frame.rgb
     
-    # 推論実行
-    results = model(image_path)
-    
-    # 人物（クラス0）のみを抽出
-    person_detections = []
-    for r in results:
-        boxes = r.boxes
-        if boxes is not None:
-            for box in boxes:
-                class_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-                
-                # クラス0が人物
-                if class_id == 0 and confidence > 0.5:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    person_detections.append({
-                        'bbox': (int(x1), int(y1), int(x2), int(y2)),
-                        'confidence': confidence
-                    })
+    # 推論実行し、人物（クラス0）のみを抽出
+    # YOLOv8モデルはnano版（軽量）。2回目以降は読み込み済みのモデルを再利用
+    person_detections = detections if detections is not None else detect_people_yolo(frame.bgr)
     
     # 結果を描画
     result_image = image_rgb.copy()
@@ -197,36 +442,80 @@ def yolo_person_detection(image_path, output_dir=None):
     return result_image, person_detections
 
 
-def opencv_person_detection(image_path, output_dir=None):
-    """OpenCVのHOG + SVMを使った人物検出"""
-    print_section("OpenCV人物検出")
-    
-    # 出力ディレクトリを設定
-    if output_dir is None:
-        output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
-    os.makedirs(output_dir, exist_ok=True)
+# HOG人物検出の設定（速度と検出漏れのバランス）
+# max_side: 検出前に画像の長辺をこの大きさまで縮小（None で縮小しない）
+HOG_PRESETS = {
+    # 従来の設定（元の解像度のまま細かく探す。12MPの写真では数秒かかる）
+    'accurate': {'max_side': None, 'win_stride': (8, 8), 'padding': (32, 32), 'scale': 1.05},
+    # 長辺1280pxに縮小（人物がある程度大きく写っている写真向け）
+    'balanced': {'max_side': 1280, 'win_stride': (8, 8), 'padding': (16, 16), 'scale': 1.05},
+    # 長辺640pxに縮小し、探索するスケールも粗くする。小さく写った人物は見逃しやすい
+    'fast': {'max_side': 640, 'win_stride': (8, 8), 'padding': (8, 8), 'scale': 1.1},
+}
+
+
+def box_iou(a, b):
+    """2つの枠 (x1, y1, x2, y2) の重なり具合（IoU: 共通部分の面積 / 合わせた面積）"""
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def parse_feature_layers(value):
+    """'block1_conv1,3' 形式の文字列を層の指定のリストに変換（数字は model.layers のインデックス）"""
+    return [int(v) if v.strip().lstrip('-').isdigit() else v.strip() for v in value.split(',')]
+
+
+def parse_roi(value):
+    """'x1,y1,x2,y2' 形式の文字列を検出範囲のタプルに変換"""
+    x1, y1, x2, y2 = (int(v) for v in value.split(','))
+    if x2 <= x1 or y2 <= y1:
+        raise argparse.ArgumentTypeError("範囲は x1,y1,x2,y2（x1<x2, y1<y2）で指定してください")
+    return x1, y1, x2, y2
+
+
+def detect_people_hog(image_rgb, preset='accurate', roi=None):
+    """HOG + SVMで人物を検出し、検出結果のリストを返す
+
+    preset: HOG_PRESETS の名前（'accurate' は従来どおり元の解像度で検出）
+    roi: 検出する範囲 (x1, y1, x2, y2)。指定すると範囲外は探索しない
+    縮小・切り出しをした場合も、枠は元の画像の座標に戻して返す。
+    """
+    settings = HOG_PRESETS[preset]
     
-    # 画像を読み込み
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    # 検出範囲を切り出す（コピーせずに参照のみ）
+    offset_x, offset_y = 0, 0
+    if roi is not None:
+        height, width = image_rgb.shape[:2]
+        x1, y1 = max(0, roi[0]), max(0, roi[1])
+        x2, y2 = min(width, roi[2]), min(height, roi[3])
+        # 範囲が画像の外にある場合は探索しない（バッチ・動画では画像ごとに大きさが違うことがある）
+        if x2 <= x1 or y2 <= y1:
+            return []
+        image_rgb = image_rgb[y1:y2, x1:x2]
+        offset_x, offset_y = x1, y1
     
-    # HOG記述子を初期化
-    hog = cv2.HOGDescriptor()
-    hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    # 長辺が max_side を超える場合は縮小して検出する
+    factor = 1.0
+    max_side = settings['max_side']
+    if max_side is not None and max(image_rgb.shape[:2]) > max_side:
+        factor = max_side / max(image_rgb.shape[:2])
+        image_rgb = cv2.resize(image_rgb, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
     
-    # 人物検出を実行
+    hog = get_hog_detector()
     boxes, weights = hog.detectMultiScale(
         image_rgb,
-        winStride=(8, 8),
-        padding=(32, 32),
-        scale=1.05,
+        winStride=settings['win_stride'],
+        padding=settings['padding'],
+        scale=settings['scale'],
         useMeanshiftGrouping=False
     )
     
-    # 結果を描画
-    result_image = image_rgb.copy()
     person_detections = []
-    
     for i, (x, y, w, h) in enumerate(boxes):
         # weightsの形状を確認して適切に処理
         if len(weights) > 0:
@@ -237,15 +526,49 @@ def opencv_person_detection(image_path, output_dir=None):
         else:
             confidence = 0.5
         
-        # バウンディングボックスを描画
-        cv2.rectangle(result_image, (x, y), (x + w, y + h), (255, 0, 0), 2)
-        cv2.putText(result_image, f'Person: {confidence:.2f}', 
-                   (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-        
+        # 縮小前・切り出し前の座標に戻す
         person_detections.append({
-            'bbox': (x, y, x + w, y + h),
+            'bbox': (int(x / factor) + offset_x, int(y / factor) + offset_y,
+                     int((x + w) / factor) + offset_x, int((y + h) / factor) + offset_y),
             'confidence': float(confidence)
         })
+    return person_detections
+
+
+def opencv_person_detection(image_path, output_dir=None, frame=None, detections=None,
+                            hog_preset='accurate', roi=None):
+    """OpenCVのHOG + SVMを使った人物検出
+
+    frame を渡すとファイルを読み込み直さず、detections（検出済みの結果）を渡すと描画と保存だけを行う。
+    hog_preset・roi は detect_people_hog を参照。
+    """
+    print_section("OpenCV人物検出")
+    
+    # 出力ディレクトリを設定
+    if output_dir is None:
+        output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 画像を読み込み
+    if frame is None:
+        frame = load_frame(image_path)
+    image_rgb = frame.rgb
+    
+    # 人物検出を実行
+    if detections is None:
+        detections = detect_people_hog(image_rgb, hog_preset, roi)
+    person_detections = detections
+    
+    # 結果を描画
+    result_image = image_rgb.copy()
+    for detection in person_detections:
+        x1, y1, x2, y2 = detection['bbox']
+        confidence = detection['confidence']
+        
+        # バウンディングボックスを描画
+        cv2.rectangle(result_image, (x1, y1), (x2, y2), (255, 0, 0), 2)
+        cv2.putText(result_image, f'Person: {confidence:.2f}', 
+                   (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
     
     print(f"検出された人物数: {len(person_detections)}")
     for i, detection in enumerate(person_detections):
@@ -264,8 +587,25 @@ def opencv_person_detection(image_path, output_dir=None):
     return result_image, person_detections
 
 
-def opencv_face_detection(image_path, output_dir=None):
-    """OpenCVのカスケード分類器を使った顔検出"""
+def detect_faces(gray):
+    """カスケード分類器でグレースケール画像から顔を検出し、検出結果のリストを返す"""
+    face_cascade = get_face_cascade()
+    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    
+    return [
+        {
+            'bbox': (int(x), int(y), int(x + w), int(y + h)),
+            'confidence': 1.0  # カスケード分類器は信頼度を返さない
+        }
+        for (x, y, w, h) in faces
+    ]
+
+
+def opencv_face_detection(image_path, output_dir=None, frame=None, detections=None):
+    """OpenCVのカスケード分類器を使った顔検出
+
+    frame を渡すとファイルを読み込み直さず、detections（検出済みの結果）を渡すと描画と保存だけを行う。
+    """
     print_section("OpenCV顔検出")
     
     # 出力ディレクトリを設定
@@ -274,29 +614,20 @@ def opencv_face_detection(image_path, output_dir=None):
     os.makedirs(output_dir, exist_ok=True)
     
     # 画像を読み込み
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    
-    # カスケード分類器をロード
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    if frame is None:
+        frame = load_frame(image_path)
+    image_rgb, gray = frame.rgb, frame.gray
     
     # 顔検出
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    face_detections = detections if detections is not None else detect_faces(gray)
     
     # 結果を描画
     result_image = image_rgb.copy()
-    face_detections = []
-    
-    for (x, y, w, h) in faces:
-        cv2.rectangle(result_image, (x, y), (x + w, y + h), (0, 0, 255), 2)
+    for detection in face_detections:
+        x1, y1, x2, y2 = detection['bbox']
+        cv2.rectangle(result_image, (x1, y1), (x2, y2), (0, 0, 255), 2)
         cv2.putText(result_image, 'Face', 
-                   (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
-        face_detections.append({
-            'bbox': (x, y, x + w, y + h),
-            'confidence': 1.0  # カスケード分類器は信頼度を返さない
-        })
+                   (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
     
     print(f"検出された顔数: {len(face_detections)}")
     
@@ -313,8 +644,39 @@ def opencv_face_detection(image_path, output_dir=None):
     return result_image, face_detections
 
 
-def compare_all_methods(image_path, output_dir=None):
-    """すべての検出方法を比較"""
+def run_detectors(detectors, concurrent=True):
+    """{名前: 関数} の検出器を実行し、({名前: 検出結果}, {名前: 所要時間（秒）}, 全体の所要時間（秒）) を返す
+
+    concurrent=True のときはスレッドプールで同時に実行する
+    （OpenCVとPyTorchは処理中にGILを解放するため、スレッドでも並列に動く）。
+    """
+    def timed(detector):
+        start = time.perf_counter()
+        result = detector()
+        return result, time.perf_counter() - start
+    
+    start = time.perf_counter()
+    if concurrent:
+        with ThreadPoolExecutor(max_workers=len(detectors)) as executor:
+            futures = {name: executor.submit(timed, detector) for name, detector in detectors.items()}
+            outcomes = {name: future.result() for name, future in futures.items()}
+    else:
+        outcomes = {name: timed(detector) for name, detector in detectors.items()}
+    total = time.perf_counter() - start
+    
+    results = {name: result for name, (result, _) in outcomes.items()}
+    timings = {name: seconds for name, (_, seconds) in outcomes.items()}
+    return results, timings, total
+
+
+def compare_all_methods(image_path, output_dir=None, concurrent=True, hog_preset='accurate', roi=None,
+                        yolo_tile_size=None, tile_overlap=0.2):
+    """すべての検出方法を比較
+
+    concurrent=True のときは3つの検出器を同じ画像に対して同時に実行する。
+    hog_preset・roi はHOG人物検出の設定（detect_people_hog を参照）。
+    yolo_tile_size を指定するとYOLOはタイルに分けて検出する（detect_people_yolo_tiled を参照）。
+    """
     print_section("すべての検出方法の比較")
     
     # 出力ディレクトリを設定
@@ -322,10 +684,27 @@ def compare_all_methods(image_path, output_dir=None):
         output_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'generated_images', '02_ml_intro')
     os.makedirs(output_dir, exist_ok=True)
     
-    # 各手法で検出実行
-    yolo_result, yolo_detections = yolo_person_detection(image_path, output_dir)
-    opencv_result, opencv_detections = opencv_person_detection(image_path, output_dir)
-    face_result, face_detections = opencv_face_detection(image_path, output_dir)
+    # 画像は1度だけデコードし、BGR・RGB・グレースケールを各手法で共有する
+    frame = load_frame(image_path)
+    
+    # モデルの読み込みを先に済ませ、検出の所要時間に含めない
+    get_yolo_model('yolov8n.pt')
+    get_hog_detector()
+    get_face_cascade()
+    
+    # 各手法で検出実行（描画・保存はmatplotlibがスレッドセーフでないため後でまとめて行う）
+    detections, timings, total = run_detectors({
+        'yolo': lambda: detect_people_yolo(frame.bgr, tile_size=yolo_tile_size, tile_overlap=tile_overlap),
+        'opencv_hog': lambda: detect_people_hog(frame.rgb, hog_preset, roi),
+        'face': lambda: detect_faces(frame.gray),
+    }, concurrent)
+    
+    yolo_result, yolo_detections = yolo_person_detection(
+        image_path, output_dir, frame, detections['yolo'])
+    opencv_result, opencv_detections = opencv_person_detection(
+        image_path, output_dir, frame, detections['opencv_hog'])
+    face_result, face_detections = opencv_face_detection(
+        image_path, output_dir, frame, detections['face'])
     
     # 比較結果を可視化
     plt.figure(figsize=(15, 5))
@@ -357,53 +736,538 @@ def compare_all_methods(image_path, output_dir=None):
     print(f"OpenCV HOG: {len(opencv_detections)}人検出") 
     print(f"OpenCV 顔検出: {len(face_detections)}顔検出")
     
+    # 処理時間
+    print(f"\n=== 処理時間（{'同時実行' if concurrent else '順番に実行'}） ===")
+    if yolo_tile_size:
+        height, width = frame.bgr.shape[:2]
+        num_tiles = len(tile_positions(width, height, yolo_tile_size, tile_overlap))
+        print(f"YOLO: {timings['yolo'] * 1000:.1f}ms（{yolo_tile_size}pxのタイル{num_tiles}枚、"
+              f"{num_tiles / timings['yolo']:.1f} タイル/秒）")
+    else:
+        print(f"YOLO: {timings['yolo'] * 1000:.1f}ms")
+    print(f"OpenCV HOG: {timings['opencv_hog'] * 1000:.1f}ms")
+    print(f"OpenCV 顔検出: {timings['face'] * 1000:.1f}ms")
+    print(f"全体: {total * 1000:.1f}ms（各検出器の合計 {sum(timings.values()) * 1000:.1f}ms）")
+    
     return {
         'yolo': yolo_detections,
         'opencv_hog': opencv_detections,
-        'face': face_detections
+        'face': face_detections,
+        'timings': timings,
+        'total_time': total
     }
 
 
-def main():
-    parser = argparse.ArgumentParser(description='機械学習入門 - 画像認識と人物検出')
-    parser.add_argument('image_path', help='処理する画像のパス')
-    parser.add_argument('--output-dir', default='output', help='結果を保存するディレクトリ（デフォルト: output）')
-    parser.add_argument('--vgg16-only', action='store_true', help='VGG16のみ実行')
-    parser.add_argument('--detection-only', action='store_true', help='人物検出のみ実行')
-    parser.add_argument('--skip-yolo', action='store_true', help='YOLO検出をスキップ')
+# バッチ処理レポートのCSVの列
+REPORT_CSV_FIELDS = ['file', 'vgg16_label', 'vgg16_score', 'yolo_persons', 'hog_persons', 'faces', 'error']
+
+
+def vgg16_classify_batch(image_paths, batch_size=16, top=3):
+    """複数の画像をVGG16でまとめて分類し、画像ごとの上位top件 [{'label', 'score'}, ...] のリストを返す
+
+    batch_size枚ずつ配列に積み、preprocess_input と predict を1回ずつ呼ぶ。
+    """
+    model = get_vgg16_model()
+    results = []
+    for start in range(0, len(image_paths), batch_size):
+        paths = image_paths[start:start + batch_size]
+        batch = np.stack([
+            image.img_to_array(image.load_img(path, target_size=(224, 224))) for path in paths
+        ])
+        predictions = model.predict(preprocess_input(batch), verbose=0)
+        for decoded in decode_predictions(predictions, top=top):
+            results.append([{'label': label, 'score': float(score)} for _, label, score in decoded])
+    return results
+
+
+def yolo_detect_batch(image_paths, batch_size=16, conf_threshold=0.5, classes=(0,)):
+    """複数の画像をYOLOにリストでまとめて渡し、画像ごとの人物の検出結果のリストを返す"""
+    model = get_yolo_model('yolov8n.pt')
+    detections = []
+    for start in range(0, len(image_paths), batch_size):
+        results = model(image_paths[start:start + batch_size], verbose=False)
+        detections.extend(extract_person_detections(r, conf_threshold, classes) for r in results)
+    return detections
+
+
+def write_report(records, output_dir):
+    """画像ごとの結果を report.csv（一覧）と report.json（検出位置を含む詳細）に保存"""
+    csv_path = os.path.join(output_dir, "report.csv")
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_CSV_FIELDS)
+        writer.writeheader()
+        for record in records:
+            top1 = record['vgg16'][0] if record.get('vgg16') else {'label': None, 'score': None}
+            writer.writerow({
+                'file': record['file'],
+                'vgg16_label': top1['label'],
+                'vgg16_score': f"{top1['score']:.4f}" if top1['score'] is not None else None,
+                'yolo_persons': len(record['yolo']) if 'yolo' in record else None,
+                'hog_persons': len(record['hog']) if 'hog' in record else None,
+                'faces': len(record['faces']) if 'faces' in record else None,
+                'error': record.get('error'),
+            })
     
-    args = parser.parse_args()
+    json_path = os.path.join(output_dir, "report.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    return csv_path, json_path
+
+
+def process_batch(image_paths, output_dir, args):
+    """複数の画像をまとめて処理し、結果を1つのレポートにまとめる（画像ごとのPNGは作らない）"""
+    start_time = time.perf_counter()
+    records = [{'file': path} for path in image_paths]
     
-    # 画像の存在確認
-    if not os.path.exists(args.image_path):
-        print(f"エラー: 画像ファイル '{args.image_path}' が見つかりません。")
-        sys.exit(1)
+    # 読み込めない画像はレポートにエラーとして残し、推論からは除く
+    valid = []
+    for record in records:
+        try:
+            with Image.open(record['file']) as img:
+                img.verify()
+            valid.append(record)
+        except Exception as e:
+            record['error'] = str(e)
+            print(f"⚠️  読み込めません: {record['file']} ({e})")
+    paths = [record['file'] for record in valid]
     
-    print(f"画像を処理します: {args.image_path}")
-    print(f"出力ディレクトリ: {args.output_dir}")
+    if not args.detection_only and paths:
+        print_section(f"VGG16による画像分類（{len(paths)}枚 / バッチ{args.batch_size}枚）")
+        for record, top in zip(valid, vgg16_classify_batch(paths, args.batch_size)):
+            record['vgg16'] = top
     
-    # 出力ディレクトリ作成
-    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.vgg16_only and paths:
+        if not args.skip_yolo and args.yolo_tile_size:
+            # 画像ごとにタイルへ分け、タイルをまとめて推論する
+            print_section(f"YOLO人物検出（{len(paths)}枚 / {args.yolo_tile_size}pxのタイル）")
+            for record in valid:
+                record['yolo'] = detect_people_yolo_tiled(
+                    load_frame(record['file']).bgr, args.yolo_tile_size, args.tile_overlap,
+                    batch_size=args.batch_size)
+        elif not args.skip_yolo:
+            print_section(f"YOLO人物検出（{len(paths)}枚 / バッチ{args.batch_size}枚）")
+            for record, detections in zip(valid, yolo_detect_batch(paths, args.batch_size)):
+                record['yolo'] = detections
+        
+        print_section(f"OpenCV人物・顔検出（{len(paths)}枚）")
+        for record in valid:
+            frame = load_frame(record['file'])
+            record['hog'] = detect_people_hog(frame.rgb, args.hog_preset, args.roi)
+            record['faces'] = detect_faces(frame.gray)
+    
+    elapsed = time.perf_counter() - start_time
+    csv_path, json_path = write_report(records, output_dir)
+    
+    print("\n=== 処理結果 ===")
+    print(f"処理枚数: {len(valid)}枚（エラー {len(records) - len(valid)}枚）")
+    print(f"処理時間: {elapsed:.1f}秒（{len(valid) / elapsed:.1f}枚/秒）")
+    print(f"レポートを保存しました: {csv_path}")
+    print(f"詳細（検出位置など）: {json_path}")
+    return records
+
+
+class BoxTracker:
+    """検出結果の枠をフレーム間で対応付け、同じ物体に同じIDを振る簡易トラッカー
+
+    検出したフレームでは update() で前の枠と IoU で対応付け、移動量（1フレームあたり）を更新する。
+    検出しないフレームでは predict() で各枠を移動量の分だけ進める（等速で動くと仮定）。
+    iou_threshold: 同じ物体とみなす IoU の下限
+    max_shift: IoU で対応しなかった枠を、中心の移動量が枠の対角線のこの割合以下なら同じ物体とみなす
+        （動き始めでまだ移動量が分からず、枠が重ならないほど動いた場合のため）
+    max_missed: 何回続けて検出されなければ追跡をやめるか
+        （見失っている間の枠は、再び検出されたときの対応付けにだけ使い、結果には含めない）
+    """
+
+    def __init__(self, iou_threshold=0.3, max_shift=0.5, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.max_shift = max_shift
+        self.max_missed = max_missed
+        self._tracks = []
+        self._next_id = 1
+
+    def _output(self):
+        """直近の検出で見つかった枠だけを返す（見失った枠は描画・記録しない）"""
+        return [
+            {
+                'id': track['id'],
+                'bbox': tuple(int(round(v)) for v in track['bbox']),
+                'confidence': track['confidence'],
+            }
+            for track in self._tracks
+            if track['missed'] == 0
+        ]
+
+    @staticmethod
+    def _shift(a, b):
+        """枠 a から b への中心の移動量（a の対角線の長さに対する割合）"""
+        diagonal = np.hypot(a[2] - a[0], a[3] - a[1])
+        if diagonal <= 0:
+            return float('inf')
+        dx = (b[0] + b[2] - a[0] - a[2]) / 2
+        dy = (b[1] + b[3] - a[1] - a[3]) / 2
+        return np.hypot(dx, dy) / diagonal
+
+    def predict(self, frames=1):
+        """検出しないフレームで、各枠を frames フレーム分進めて返す"""
+        for track in self._tracks:
+            track['bbox'] = track['bbox'] + track['velocity'] * frames
+            track['age'] += frames
+        return self._output()
+
+    def update(self, detections):
+        """検出結果を既存の枠と対応付け、ID付きの検出結果のリストを返す"""
+        # IoU が大きい組から順に対応付け、残りは中心の移動量が小さい組から対応付ける
+        iou_pairs = sorted(
+            (
+                (box_iou(track['bbox'], detection['bbox']), t, d)
+                for t, track in enumerate(self._tracks)
+                for d, detection in enumerate(detections)
+            ),
+            reverse=True
+        )
+        shift_pairs = sorted(
+            (self._shift(track['bbox'], detection['bbox']), t, d)
+            for t, track in enumerate(self._tracks)
+            for d, detection in enumerate(detections)
+        )
+        candidates = [(t, d) for iou, t, d in iou_pairs if iou >= self.iou_threshold]
+        candidates += [(t, d) for shift, t, d in shift_pairs if shift <= self.max_shift]
+        
+        matched_tracks, matched_detections = set(), set()
+        for t, d in candidates:
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            
+            track = self._tracks[t]
+            bbox = np.array(detections[d]['bbox'], dtype=np.float64)
+            # 前回検出した位置からの移動量を、前回までの値と平均して滑らかにする
+            velocity = (bbox - track['detected_bbox']) / max(1, track['age'])
+            track['velocity'] = 0.5 * track['velocity'] + 0.5 * velocity
+            track.update(bbox=bbox, detected_bbox=bbox, age=0, missed=0,
+                         confidence=detections[d]['confidence'])
+        
+        # 対応しなかった枠は見失った回数を数え、続けて見つからなければ削除
+        for t, track in enumerate(self._tracks):
+            if t not in matched_tracks:
+                track['missed'] += 1
+        self._tracks = [track for track in self._tracks if track['missed'] <= self.max_missed]
+        
+        # 新しく現れた物体
+        for d, detection in enumerate(detections):
+            if d in matched_detections:
+                continue
+            bbox = np.array(detection['bbox'], dtype=np.float64)
+            self._tracks.append({
+                'id': self._next_id, 'bbox': bbox, 'detected_bbox': bbox,
+                'velocity': np.zeros(4), 'age': 0, 'missed': 0,
+                'confidence': detection['confidence'],
+            })
+            self._next_id += 1
+        return self._output()
+
+
+# 動画に描画する枠の色（BGR）とラベル
+STREAM_STYLES = {
+    'yolo': ((0, 255, 0), 'YOLO'),
+    'hog': ((0, 0, 255), 'HOG'),
+    'faces': ((255, 0, 0), 'Face'),
+}
+
+
+def is_stream_url(source):
+    """スキーム付きのURL（rtsp://, http:// など）かどうか"""
+    return '://' in source
+
+
+def is_video_source(source):
+    """動画ファイル・カメラ番号（0など）・ストリームのURL（rtsp://など）かどうか"""
+    return source.isdigit() or is_stream_url(source) or source.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def annotate_frame(image_bgr, detections):
+    """{検出器の名前: 検出結果} の枠とラベルをBGR画像に直接描画する"""
+    for name, items in detections.items():
+        color, label = STREAM_STYLES[name]
+        for detection in items:
+            x1, y1, x2, y2 = detection['bbox']
+            # 追跡中はIDも表示
+            name_text = f"{label} #{detection['id']}" if 'id' in detection else label
+            cv2.rectangle(image_bgr, (x1, y1), (x2, y2), color, 2)
+            cv2.putText(image_bgr, f"{name_text}: {detection['confidence']:.2f}",
+                        (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return image_bgr
+
+
+def read_frames(capture, frames, stop, drop_when_full, stats):
+    """動画からフレームを読み込み、(フレーム番号, BGR画像) を上限付きのキューに入れる（スレッドで実行）
+
+    drop_when_full=True（カメラ・ストリーム）のときは、処理が追いつかなければ古いフレームを捨てて
+    遅延が溜まらないようにする。動画ファイルはすべてのフレームを処理するため、空きが出るまで待つ。
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                if drop_when_full:
+                    frames.put_nowait(item)
+                else:
+                    frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if drop_when_full:
+                    try:
+                        frames.get_nowait()
+                        stats['dropped'] += 1
+                    except queue.Empty:
+                        pass
+    
+    index = 0
+    while not stop.is_set():
+        ok, image_bgr = capture.read()
+        if not ok:
+            break
+        put((index, image_bgr))
+        index += 1
+    put(None)
+
+
+def process_stream(source, output_dir, detector_names=('yolo', 'hog', 'faces'), frame_skip=1,
+                   queue_size=8, max_frames=None, concurrent=True, hog_preset='accurate', roi=None,
+                   track=False, yolo_tile_size=None, tile_overlap=0.2):
+    """動画ファイル・カメラ・ストリームの各フレームで人物・顔を検出する
+
+    frame_skip フレームごとに1回検出し、間のフレームには直前の検出結果を描画する。
+    track=True のときは BoxTracker で検出結果にIDを振り、間のフレームでは枠を動きに合わせて進める。
+    注釈付きの動画を annotated.mp4 に、検出したフレームの結果を1行1フレームで detections.jsonl に保存する
+    （track=True のときは全フレーム分）。
+    """
+    print_section("動画の人物・顔検出")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"動画を開けません: {source}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    live = not os.path.isfile(source)
+    print(f"入力: {source}（{width}x{height}, {fps:.1f}fps{', ライブ' if live else ''}）")
+    
+    # モデルの読み込みを先に済ませ、処理速度に含めない
+    if 'yolo' in detector_names:
+        get_yolo_model('yolov8n.pt')
+    get_hog_detector()
+    get_face_cascade()
+    
+    video_path = os.path.join(output_dir, "annotated.mp4")
+    jsonl_path = os.path.join(output_dir, "detections.jsonl")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    
+    # 読み込みと検出を別スレッドにし、その間は上限付きのキューでつなぐ
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    stats = {'dropped': 0}
+    reader = threading.Thread(target=read_frames, args=(capture, frames, stop, live, stats),
+                              name="frame-reader", daemon=True)
+    
+    detections = {name: [] for name in detector_names}
+    trackers = {name: BoxTracker() for name in detector_names} if track else None
+    last_index = 0
+    frame_count = 0
+    detected_count = 0
+    detect_seconds = 0.0
+    start_time = time.perf_counter()
+    reader.start()
+    try:
+        with open(jsonl_path, 'w', encoding='utf-8') as log:
+            while max_frames is None or frame_count < max_frames:
+                item = frames.get()
+                if item is None:
+                    break
+                index, image_bgr = item
+                
+                if index % frame_skip == 0:
+                    frame = make_frame(image_bgr)
+                    available = {
+                        'yolo': lambda: detect_people_yolo(frame.bgr, tile_size=yolo_tile_size,
+                                                           tile_overlap=tile_overlap),
+                        'hog': lambda: detect_people_hog(frame.rgb, hog_preset, roi),
+                        'faces': lambda: detect_faces(frame.gray),
+                    }
+                    detections, timings, elapsed = run_detectors(
+                        {name: available[name] for name in detector_names}, concurrent)
+                    detect_seconds += elapsed
+                    detected_count += 1
+                    if track:
+                        detections = {name: trackers[name].update(found)
+                                      for name, found in detections.items()}
+                    log.write(json.dumps({
+                        'frame': index,
+                        'time': round(index / fps, 3),
+                        **({'detected': True} if track else {}),
+                        **detections,
+                        'detect_ms': round(elapsed * 1000, 1),
+                    }, ensure_ascii=False) + "\n")
+                elif track:
+                    # 検出しないフレームは、前回の枠を動きに合わせて進める
+                    # （ライブ映像でフレームを捨てた場合も、番号の差だけ進める）
+                    detections = {name: tracker.predict(index - last_index)
+                                  for name, tracker in trackers.items()}
+                    log.write(json.dumps({
+                        'frame': index,
+                        'time': round(index / fps, 3),
+                        'detected': False,
+                        **detections,
+                    }, ensure_ascii=False) + "\n")
+                last_index = index
+                
+                writer.write(annotate_frame(image_bgr, detections))
+                frame_count += 1
+                if frame_count % 100 == 0:
+                    elapsed_total = time.perf_counter() - start_time
+                    print(f"  {frame_count}フレーム（{frame_count / elapsed_total:.1f}fps）")
+    finally:
+        stop.set()
+        reader.join()
+        capture.release()
+        writer.release()
+    
+    total = time.perf_counter() - start_time
+    print("\n=== 処理結果 ===")
+    print(f"フレーム数: {frame_count}（検出 {detected_count}フレーム / {frame_skip}フレームごと）")
+    if stats['dropped']:
+        print(f"処理が追いつかず捨てたフレーム: {stats['dropped']}")
+    print(f"処理時間: {total:.1f}秒")
+    print(f"処理速度: {frame_count / total:.1f}fps（入力 {fps:.1f}fps）")
+    if detected_count:
+        print(f"検出1回あたり: {detect_seconds / detected_count * 1000:.1f}ms")
+    print(f"注釈付き動画を保存しました: {video_path}")
+    print(f"検出結果を保存しました: {jsonl_path}")
+    
+    return {
+        'frames': frame_count,
+        'detected_frames': detected_count,
+        'dropped_frames': stats['dropped'],
+        'seconds': total,
+        'fps': frame_count / total if total > 0 else 0.0,
+    }
+
+
+def process_image(image_path, output_dir, args):
+    """1枚の画像をコマンドライン引数で指定された方法で処理"""
+    os.makedirs(output_dir, exist_ok=True)
     
     if not args.detection_only:
         # VGG16による画像分類
-        model, img_array, results = vgg16_image_classification(args.image_path, args.output_dir)
+        model, img_array, results = vgg16_image_classification(image_path, output_dir)
         
         # 特徴マップの可視化
-        visualize_feature_maps(model, img_array, args.output_dir)
+        visualize_feature_maps(model, img_array, output_dir, layers=args.feature_layers)
     
     if not args.vgg16_only:
         # 人物・顔検出
         if args.skip_yolo:
-            # YOLOをスキップ
-            opencv_person_detection(args.image_path, args.output_dir)
-            opencv_face_detection(args.image_path, args.output_dir)
+            # YOLOをスキップ（画像は1度だけデコードして両方で使う）
+            frame = load_frame(image_path)
+            opencv_person_detection(image_path, output_dir, frame,
+                                    hog_preset=args.hog_preset, roi=args.roi)
+            opencv_face_detection(image_path, output_dir, frame)
         else:
             # すべての方法で比較
-            compare_all_methods(args.image_path, args.output_dir)
+            compare_all_methods(image_path, output_dir, concurrent=not args.sequential,
+                                hog_preset=args.hog_preset, roi=args.roi,
+                                yolo_tile_size=args.yolo_tile_size, tile_overlap=args.tile_overlap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='機械学習入門 - 画像認識と人物検出')
+    parser.add_argument('image_path', nargs='+',
+                        help='処理する画像のパス。ディレクトリやglobパターン（"images/*.jpg"）、'
+                             '複数の画像を指定するとまとめて処理してレポートを作成。'
+                             '動画ファイル・カメラ番号（0）・rtsp:// のURLを指定するとフレームごとに人物・顔を検出')
+    parser.add_argument('--output-dir', default='output', help='結果を保存するディレクトリ（デフォルト: output）')
+    parser.add_argument('--vgg16-only', action='store_true', help='VGG16のみ実行')
+    parser.add_argument('--detection-only', action='store_true', help='人物検出のみ実行')
+    parser.add_argument('--skip-yolo', action='store_true', help='YOLO検出をスキップ')
+    parser.add_argument('--sequential', action='store_true',
+                        help='比較の3つの検出器を同時に実行せず、順番に実行（処理時間の比較用）')
+    parser.add_argument('--feature-layers', type=parse_feature_layers, default=(1,),
+                        help='特徴マップを表示する層（畳み込み・プーリング層）の名前またはインデックス'
+                             '（カンマ区切り。例: block1_conv1,block3_conv1 / 1,4）'
+                             '（デフォルト: 最初の層）')
+    parser.add_argument('--hog-preset', choices=sorted(HOG_PRESETS), default='accurate',
+                        help='HOG人物検出の速度と精度の設定。fast/balanced は縮小した画像で検出'
+                             '（デフォルト: accurate = 元の解像度）')
+    parser.add_argument('--roi', type=parse_roi, default=None,
+                        help='HOG人物検出の範囲 x1,y1,x2,y2（ピクセル）。範囲外は探索しない')
+    parser.add_argument('--yolo-tile-size', type=int, default=None,
+                        help='指定するとYOLOで画像をこのサイズ（px）のタイルに分けて検出する。'
+                             '高解像度画像に小さく写った物体向け（例: 640）')
+    parser.add_argument('--tile-overlap', type=float, default=0.2,
+                        help='タイルどうしの重なりの割合（デフォルト: 0.2）')
+    parser.add_argument('--frame-skip', type=int, default=1,
+                        help='動画で何フレームごとに検出するか（デフォルト: 1 = 毎フレーム）')
+    parser.add_argument('--track', action='store_true',
+                        help='動画で検出結果を追跡してIDを振り、検出しないフレームでは枠を動きに合わせて進める'
+                             '（--frame-skip と組み合わせて使う）')
+    parser.add_argument('--frame-queue', type=int, default=8,
+                        help='動画の読み込み待ちフレームの上限（デフォルト: 8）')
+    parser.add_argument('--max-frames', type=int, default=None,
+                        help='動画で処理する最大フレーム数（カメラ入力を止めるときなど）')
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help='複数画像の処理で1回に推論する枚数（デフォルト: 16）')
+    
+    args = parser.parse_args()
+    if not 0 <= args.tile_overlap < 1:
+        parser.error('--tile-overlap は0以上1未満で指定してください')
+    
+    # 出力ディレクトリ作成
+    os.makedirs(args.output_dir, exist_ok=True)
+    
+    # 1枚の画像ファイルの場合は、これまでどおり結果を画像で保存
+    # （URLの ? や [ はglobパターンとして扱わない）
+    first = args.image_path[0]
+    single = len(args.image_path) == 1 and (
+        is_stream_url(first) or (not os.path.isdir(first) and not glob.has_magic(first)))
+    
+    if single and is_video_source(args.image_path[0]):
+        # 動画ファイル・カメラ・ストリーム
+        source = args.image_path[0]
+        if source.lower().endswith(VIDEO_EXTENSIONS) and not os.path.exists(source):
+            print(f"エラー: 動画ファイル '{source}' が見つかりません。")
+            sys.exit(1)
+        print(f"出力ディレクトリ: {args.output_dir}")
+        detector_names = ('hog', 'faces') if args.skip_yolo else ('yolo', 'hog', 'faces')
+        process_stream(source, args.output_dir, detector_names, max(1, args.frame_skip),
+                       args.frame_queue, args.max_frames, concurrent=not args.sequential,
+                       hog_preset=args.hog_preset, roi=args.roi, track=args.track,
+                       yolo_tile_size=args.yolo_tile_size, tile_overlap=args.tile_overlap)
+    elif single:
+        image_path = args.image_path[0]
+        # 画像の存在確認
+        if not os.path.exists(image_path):
+            print(f"エラー: 画像ファイル '{image_path}' が見つかりません。")
+            sys.exit(1)
+        print(f"画像を処理します: {image_path}")
+        print(f"出力ディレクトリ: {args.output_dir}")
+        process_image(image_path, args.output_dir, args)
+    else:
+        # ディレクトリ・globパターン・複数ファイルはまとめて推論し、レポートにまとめる
+        image_paths = resolve_image_paths(args.image_path)
+        missing = [path for path in image_paths if not os.path.exists(path)]
+        if missing:
+            print(f"エラー: 画像ファイル '{missing[0]}' が見つかりません。")
+            sys.exit(1)
+        if not image_paths:
+            print(f"エラー: {' '.join(args.image_path)} に画像ファイルがありません。")
+            sys.exit(1)
+        print(f"{len(image_paths)}枚の画像を処理します")
+        print(f"出力ディレクトリ: {args.output_dir}")
+        process_batch(image_paths, args.output_dir, args)
     
     print(f"\n処理が完了しました！結果は '{args.output_dir}' ディレクトリに保存されています。")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
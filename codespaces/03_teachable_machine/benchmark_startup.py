@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+test_model.py の起動時間ベンチマーク
+TensorFlow / matplotlib を先に import した場合（従来の動作）と、
+必要になるまで import しない場合（現在の動作）の起動時間を比較する
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_model.py")
+
+# 従来の動作を再現: 重いライブラリを先に import してからスクリプトを実行
+EAGER_PRELUDE = (
+    "import sys, runpy; "
+    "import tensorflow, matplotlib.pyplot; "
+    "sys.argv = sys.argv[1:]; "
+    "runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def run_once(cmd, cwd):
+    """コマンドを1回実行して経過時間（秒）を返す"""
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - start
+
+
+def measure(cmd, cwd, repeat):
+    """repeat回実行した経過時間の中央値"""
+    return statistics.median(run_once(cmd, cwd) for _ in range(repeat))
+
+
+def measure_compile(model_path, repeat):
+    """load_model 後に compile() する場合としない場合の読み込み時間を比較"""
+    from tensorflow import keras
+
+    results = {}
+    for use_compile in (True, False):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model = keras.models.load_model(model_path, compile=False)
+            if use_compile:
+                model.compile(
+                    optimizer='adam',
+                    loss='categorical_crossentropy',
+                    metrics=['accuracy']
+                )
+            times.append(time.perf_counter() - start)
+        results[use_compile] = statistics.median(times)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="test_model.py の起動時間を計測")
+    parser.add_argument("--repeat", type=int, default=3, help="各ケースの実行回数 (default: 3)")
+    parser.add_argument("--model-path", help="指定すると compile() の有無による読み込み時間も計測")
+    args = parser.parse_args()
+
+    print("⏱️  test_model.py 起動時間ベンチマーク")
+    print("=" * 60)
+
+    cases = [
+        ("--help", ["--help"]),
+        ("--create-sample", ["--create-sample"]),
+        ("引数エラー", ["--batch-size", "0"]),
+    ]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'ケース':20} {'従来(先にimport)':>16} {'遅延import':>12} {'短縮':>8}")
+        for name, script_args in cases:
+            eager = measure([sys.executable, "-c", EAGER_PRELUDE, SCRIPT_PATH, *script_args],
+                            workdir, args.repeat)
+            lazy = measure([sys.executable, SCRIPT_PATH, *script_args], workdir, args.repeat)
+            print(f"{name:20} {eager:>15.2f}s {lazy:>11.2f}s {eager - lazy:>7.2f}s")
+
+    if args.model_path:
+        print("\n📦 モデル読み込み時間（プロセス内）")
+        results = measure_compile(args.model_path, args.repeat)
+        print(f"  load_model + compile(): {results[True]:.3f}s")
+        print(f"  load_model のみ       : {results[False]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,25 +7,41 @@ Teachable Machine モデルテストスクリプト
 import os
 import sys
 import argparse
+import csv
+import time
 import numpy as np
 from PIL import Image
-import tensorflow as tf
-from tensorflow import keras
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')  # GUI無し環境用
+# TensorFlow と matplotlib は読み込みに数秒かかるため、
+# 実際にモデルやグラフが必要になった関数の中で import する
 
-def load_teachable_machine_model(model_path, labels_path):
-    """Teachable Machineのモデルとラベルを読み込む"""
-    print(f"📦 モデルを読み込み中: {model_path}")
+# 共通ユーティリティ（codespaces/utils）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.prediction_cache import PredictionCache, DEFAULT_CACHE_PATH, hash_file, hash_image_array
+from utils.tflite_backend import QUANTIZATIONS, load_tflite_model, compare_backends
+from utils.model_warmup import TracedModel, warm_up, format_warmup
+from utils.tiling import tile_positions, merge_tile_scores
+
+def load_teachable_machine_model(model_path, labels_path, backend='keras',
+                                 quantization='float16', representative_data=None,
+                                 warmup_batch_sizes=(1,)):
+    """Teachable Machineのモデルとラベルを読み込む
+
+    backend='tflite' の場合は TFLite に変換（初回のみ、以降はキャッシュ）した
+    モデルを返す。どちらも predict() / model(x) で推論できる。
+    読み込み後に warmup_batch_sizes の各バッチサイズでウォームアップする。
+    """
+    print(f"📦 モデルを読み込み中: {model_path} (backend: {backend})")
     
     # モデルを読み込む
-    model = keras.models.load_model(model_path, compile=False)
-    model.compile(
-        optimizer='adam',
-        loss='categorical_crossentropy',
-        metrics=['accuracy']
-    )
+    if backend == 'tflite':
+        model = load_tflite_model(
+            model_path, quantization, representative_data=representative_data
+        )
+    else:
+        from tensorflow import keras
+        # 推論のみなので compile() は不要（オプティマイザ等の構築を省略）
+        # 推論関数は tf.function としてトレースし、呼び出しごとのオーバーヘッドを減らす
+        model = TracedModel(keras.models.load_model(model_path, compile=False))
     
     # ラベルを読み込む
     with open(labels_path, 'r', encoding='utf-8') as f:
@@ -35,6 +51,10 @@ def load_teachable_machine_model(model_path, labels_path):
     print(f"クラス数: {len(labels)}")
     print(f"クラス: {', '.join(labels)}")
     
+    # 最初の画像の推論が遅くならないよう、トレースとメモリ確保を先に済ませる
+    if warmup_batch_sizes:
+        print(format_warmup(*warm_up(model, warmup_batch_sizes)))
+    
     return model, labels
 
 def preprocess_image(image_path, target_size=(224, 224)):
@@ -60,31 +80,72 @@ def preprocess_image(image_path, target_size=(224, 224)):
     
     return img, img_array
 
-def predict_image(model, labels, image_path, output_dir="output"):
-    """画像を予測"""
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 画像を前処理
-    original_img, processed_img = preprocess_image(image_path)
-    
-    # 予測
-    print(f"\n🔍 予測中: {image_path}")
-    predictions = model.predict(processed_img)
+def load_image_into(image_path, out, target_size=(224, 224)):
+    """画像を読み込み、確保済みの配列 out (H, W, 3) に正規化して書き込む"""
+    with Image.open(image_path) as img:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img = img.resize(target_size)
+        out[...] = np.asarray(img, dtype=np.float32)
+    out *= 1.0 / 255.0
+
+def load_images_array(image_paths, target_size=(224, 224)):
+    """複数の画像を (N, H, W, 3) の正規化済み配列にまとめて読み込む（読めない画像は除外）"""
+    images = np.empty((len(image_paths), target_size[1], target_size[0], 3), dtype=np.float32)
+    n = 0
+    for image_path in image_paths:
+        try:
+            load_image_into(image_path, images[n], target_size)
+            n += 1
+        except Exception as e:
+            print(f"❌ エラー ({os.path.basename(image_path)}): {e}")
+    return images[:n]
+
+def report_backend_comparison(model_path, candidate_model, labels, image_paths,
+                              output_dir="output", batch_size=32, workers=4):
+    """Kerasモデルとの予測差（精度差）と速度をレポート
+
+    画像は batch_size 枚ずつデコードして両方のモデルに通し、差を集計する
+    （全画像を1つの配列に読み込まないため、枚数が多くてもメモリを使わない）。
+    """
+    import json
+    
+    print(f"\n⚖️  Kerasモデルとの比較: {len(image_paths)}枚")
+    from tensorflow import keras
+    reference_model = keras.models.load_model(model_path, compile=False)
+    # image_paths はパスのため、ディレクトリは空にして結合させない
+    batches = (batch for batch, _ in iter_decoded_batches(
+        '', image_paths, batch_size, workers=workers))
+    report = compare_backends(reference_model, candidate_model, batches, labels)
+    if report is None:
+        print("⚠️  比較に使える画像がありません")
+        return None
+    
+    print(f"Top-1一致率: {report['top1_agreement'] * 100:.2f}%"
+          f"（不一致 {report['disagreements']}枚）")
+    print(f"確率の差: 最大 {report['max_abs_delta'] * 100:.3f}pt / "
+          f"平均 {report['mean_abs_delta'] * 100:.3f}pt")
+    for label, value in report['per_class_mean_abs_delta'].items():
+        print(f"  {label}: 平均 {value * 100:.3f}pt")
+    print(f"速度: Keras {report['reference_images_per_sec']:.1f} 枚/秒 → "
+          f"比較対象 {report['candidate_images_per_sec']:.1f} 枚/秒")
     
-    # 結果を取得
-    predicted_class = np.argmax(predictions[0])
-    confidence = predictions[0][predicted_class] * 100
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = os.path.join(output_dir, "backend_comparison.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 比較レポートを保存: {report_path}")
     
-    print(f"\n📊 予測結果:")
-    print(f"予測クラス: {labels[predicted_class]}")
-    print(f"信頼度: {confidence:.2f}%")
+    return report
+
+def save_prediction_plot(original_img, image_path, labels, probabilities, output_dir="output"):
+    """予測結果（入力画像と確率の棒グラフ）を画像として保存"""
+    import matplotlib
+    matplotlib.use('Agg')  # GUI無し環境用
+    import matplotlib.pyplot as plt
     
-    # 全クラスの確率を表示
-    print(f"\n全クラスの確率:")
-    for i, (label, prob) in enumerate(zip(labels, predictions[0])):
-        print(f"  {label}: {prob*100:.2f}%")
+    predicted_class = np.argmax(probabilities)
     
-    # 結果を可視化
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
     
     # 元画像を表示
@@ -94,7 +155,7 @@ def predict_image(model, labels, image_path, output_dir="output"):
     
     # 予測結果を棒グラフで表示
     y_pos = np.arange(len(labels))
-    ax2.barh(y_pos, predictions[0] * 100)
+    ax2.barh(y_pos, probabilities * 100)
     ax2.set_yticks(y_pos)
     ax2.set_yticklabels(labels)
     ax2.set_xlabel('確率 (%)')
@@ -102,64 +163,344 @@ def predict_image(model, labels, image_path, output_dir="output"):
     ax2.set_xlim(0, 100)
     
     # 予測クラスをハイライト
-    ax2.barh(predicted_class, predictions[0][predicted_class] * 100, color='red')
+    ax2.barh(predicted_class, probabilities[predicted_class] * 100, color='red')
     
     plt.tight_layout()
     
     # 保存
     output_path = os.path.join(output_dir, f"prediction_{os.path.basename(image_path)}")
     plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    plt.close(fig)
+    
+    return output_path
+
+def predict_image(model, labels, image_path, output_dir="output",
+                  cache=None, model_hash=None):
+    """画像を予測（cache を渡すと同じ画像・同じモデルの結果を再利用）"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 画像を前処理
+    original_img, processed_img = preprocess_image(image_path)
+    
+    # 予測（キャッシュにあれば推論を省略）
+    print(f"\n🔍 予測中: {image_path}")
+    predictions = None
+    if cache is not None:
+        image_hash = hash_image_array(np.asarray(original_img))
+        cached = cache.get(model_hash, image_hash)
+        if cached is not None:
+            print("⚡ キャッシュから結果を取得")
+            predictions = cached[np.newaxis]
+    if predictions is None:
+        predictions = model.predict(processed_img)
+        if cache is not None:
+            cache.put(model_hash, image_hash, predictions[0])
+    
+    # 結果を取得
+    predicted_class = np.argmax(predictions[0])
+    confidence = predictions[0][predicted_class] * 100
+    
+    print(f"\n📊 予測結果:")
+    print(f"予測クラス: {labels[predicted_class]}")
+    print(f"信頼度: {confidence:.2f}%")
+    
+    # 全クラスの確率を表示
+    print(f"\n全クラスの確率:")
+    for i, (label, prob) in enumerate(zip(labels, predictions[0])):
+        print(f"  {label}: {prob*100:.2f}%")
+    
+    # 結果を可視化して保存
+    output_path = save_prediction_plot(
+        original_img, image_path, labels, predictions[0], output_dir
+    )
     
     print(f"\n💾 結果を保存: {output_path}")
     
     return predicted_class, confidence
 
-def batch_predict(model, labels, image_dir, output_dir="output"):
-    """複数画像を一括予測"""
+def predict_batch(model, batch):
+    """バッチ (N, H, W, 3) を1回の順伝播で予測し、確率を numpy 配列で返す
+
+    model.predict() は呼び出しごとにデータアダプタ等を作るため、
+    小さなチャンクを繰り返し推論する場合は直接呼び出す方が速い。
+    """
+    return np.asarray(model(batch, training=False))
+
+def list_image_files(image_dir):
+    """ディレクトリ内の画像ファイル名を取得"""
+    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
+    return sorted(f for f in os.listdir(image_dir)
+                  if os.path.splitext(f.lower())[1] in image_extensions)
+
+def _decode_chunk(executor, image_dir, chunk, out, target_size):
+    """チャンク内の画像を out の各行へ並列デコードするタスクを投入"""
+    return [
+        executor.submit(load_image_into, os.path.join(image_dir, image_file), out[i], target_size)
+        for i, image_file in enumerate(chunk)
+    ]
+
+def iter_decoded_batches(image_dir, image_files, batch_size=32,
+                         target_size=(224, 224), workers=4, failed=None):
+    """デコード済みのバッチ (配列, ファイル名リスト) を順に返すジェネレータ
+
+    スレッドプールで画像を並列にデコードし、呼び出し側が現在のバッチを
+    推論している間に次のチャンクのデコードを先行して進める（ダブルバッファ）。
+    返される配列は次の反復で上書きされるため、使い終わってから次へ進むこと。
+    読み込めなかった画像は飛ばし、failed（リスト）を渡すとそのファイル名を追加する。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    shape = (batch_size, target_size[1], target_size[0], 3)
+    buffers = [np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32)]
+    chunks = [image_files[i:i + batch_size] for i in range(0, len(image_files), batch_size)]
+    if not chunks:
+        return
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = _decode_chunk(executor, image_dir, chunks[0], buffers[0], target_size)
+        
+        for k, chunk in enumerate(chunks):
+            futures = pending
+            # 次のチャンクのデコードを先に投入しておく
+            if k + 1 < len(chunks):
+                pending = _decode_chunk(
+                    executor, image_dir, chunks[k + 1], buffers[(k + 1) % 2], target_size
+                )
+            
+            batch = buffers[k % 2]
+            ok = []
+            for i, (image_file, future) in enumerate(zip(chunk, futures)):
+                try:
+                    future.result()
+                    ok.append(i)
+                except Exception as e:
+                    print(f"❌ エラー ({image_file}): {e}")
+                    if failed is not None:
+                        failed.append(image_file)
+            
+            if not ok:
+                continue
+            if len(ok) < len(chunk):
+                # 失敗した画像を詰めて先頭に揃える
+                batch[:len(ok)] = batch[ok]
+            
+            yield batch[:len(ok)], [chunk[i] for i in ok]
+
+BATCH_CSV_FIELDS = ['file', 'class', 'confidence']
+
+def load_scored_files(csv_path):
+    """既存の結果CSVから予測済みのファイル名を読み込む（--resume用）
+
+    途中で強制終了した場合に備え、改行で終わっていない最終行は
+    書きかけとみなして切り詰め、そのファイルは再計算の対象にする。
+    """
+    if not os.path.exists(csv_path):
+        return set()
+    
+    with open(csv_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+    
+    scored = set()
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('file') and row.get('confidence'):
+                scored.add(row['file'])
+    return scored
+
+def batch_predict(model, labels, image_dir, output_dir="output",
+                  batch_size=32, save_plots=False, target_size=(224, 224),
+                  workers=4, resume=False):
+    """複数画像を一括予測（batch_size枚ずつまとめて推論）
+
+    結果はチャンクごとに batch_results.csv へ追記・フラッシュするため、
+    途中で止まっても resume=True で未処理の画像だけを再開できる。
+    """
+    from collections import Counter
+    
     print(f"\n📁 ディレクトリ内の画像を一括処理: {image_dir}")
+    os.makedirs(output_dir, exist_ok=True)
     
     # 画像ファイルを取得
-    image_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
-    image_files = [f for f in os.listdir(image_dir) 
-                   if os.path.splitext(f.lower())[1] in image_extensions]
+    image_files = list_image_files(image_dir)
     
     if not image_files:
         print("⚠️  画像ファイルが見つかりません")
         return
     
-    print(f"見つかった画像: {len(image_files)}枚")
+    csv_path = os.path.join(output_dir, "batch_results.csv")
     
-    results = []
-    for image_file in image_files:
-        image_path = os.path.join(image_dir, image_file)
-        try:
-            predicted_class, confidence = predict_image(
-                model, labels, image_path, output_dir
-            )
-            results.append({
-                'file': image_file,
-                'class': labels[predicted_class],
-                'confidence': confidence
-            })
-        except Exception as e:
-            print(f"❌ エラー ({image_file}): {e}")
+    # 再開モードでは予測済みの画像をスキップ
+    if resume:
+        scored = load_scored_files(csv_path)
+        if scored:
+            total = len(image_files)
+            image_files = [f for f in image_files if f not in scored]
+            print(f"🔁 再開: {total - len(image_files)}枚は予測済みのためスキップ")
+        if not image_files:
+            print("✅ すべての画像が予測済みです")
+            return
+    
+    print(f"見つかった画像: {len(image_files)}枚"
+          f"（バッチサイズ: {batch_size}, デコードスレッド: {workers}）")
+    
+    class_counts = Counter()
+    processed = 0
+    failed = []
+    start_time = time.perf_counter()
+    append = resume and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0
+    with open(csv_path, 'a' if append else 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=BATCH_CSV_FIELDS)
+        if not append:
+            writer.writeheader()
+        
+        for batch, loaded in iter_decoded_batches(
+            image_dir, image_files, batch_size, target_size, workers, failed
+        ):
+            # チャンク全体を1回で推論
+            probabilities = predict_batch(model, batch)
+            predicted = np.argmax(probabilities, axis=1)
+            
+            for i, image_file in enumerate(loaded):
+                row = {
+                    'file': image_file,
+                    'class': labels[predicted[i]],
+                    'confidence': float(probabilities[i, predicted[i]] * 100)
+                }
+                writer.writerow(row)
+                class_counts[row['class']] += 1
+                print(f"{row['file']:30} → {row['class']:15} ({row['confidence']:.1f}%)")
+                
+                if save_plots:
+                    image_path = os.path.join(image_dir, image_file)
+                    save_prediction_plot(
+                        batch[i], image_path, labels, probabilities[i], output_dir
+                    )
+            
+            # チャンクごとにディスクへ書き出す
+            f.flush()
+            os.fsync(f.fileno())
+            processed += len(loaded)
+            # 読み込めなかった画像も処理済みに数え、最後に合計と一致させる
+            print(f"  処理済み: {processed + len(failed)}/{len(image_files)}"
+                  + (f"（エラー {len(failed)}枚）" if failed else ""))
+    
+    elapsed = time.perf_counter() - start_time
     
     # 結果をサマリー表示
     print("\n📊 バッチ処理結果サマリー")
     print("=" * 60)
-    for result in results:
-        print(f"{result['file']:30} → {result['class']:15} ({result['confidence']:.1f}%)")
+    for label, count in class_counts.most_common():
+        print(f"{label:15} {count}枚")
+    if failed:
+        print(f"{'エラー':15} {len(failed)}枚（読み込めなかった画像）")
     
-    # 結果をCSVに保存
-    import csv
-    csv_path = os.path.join(output_dir, "batch_results.csv")
+    print(f"\n💾 結果CSVを保存: {csv_path}")
+    if elapsed > 0:
+        print(f"⏱️  {processed}枚 / {elapsed:.2f}秒 = {processed / elapsed:.1f} 枚/秒")
+
+def load_tiles(image_path, tile_size, overlap=0.25, target_size=(224, 224)):
+    """画像を重なりのあるタイルに分け、(元画像, タイル位置, 正規化済みタイル配列) を返す
+
+    各タイルは元の解像度で切り出してから target_size にリサイズするため、
+    画像全体を縮小するよりも小さな傷が潰れにくい。
+    """
+    with Image.open(image_path) as opened:
+        img = opened.convert('RGB')
+    
+    positions = tile_positions(img.width, img.height, tile_size, overlap)
+    tiles = np.empty((len(positions), target_size[1], target_size[0], 3), dtype=np.float32)
+    for i, box in enumerate(positions):
+        tiles[i] = np.asarray(img.crop(box).resize(target_size), dtype=np.float32)
+    tiles *= 1.0 / 255.0
+    return img, positions, tiles
+
+def predict_tiles(model, tiles, batch_size=32):
+    """タイル配列を batch_size 枚ずつ推論し、タイルごとの確率 (T, C) を返す"""
+    return np.concatenate([
+        predict_batch(model, tiles[start:start + batch_size])
+        for start in range(0, len(tiles), batch_size)
+    ])
+
+def save_tile_plot(img, box, image_path, labels, probabilities, output_dir="output"):
+    """判定の根拠になったタイルを枠で囲み、予測結果のグラフとして保存"""
+    from PIL import ImageDraw
+    
+    marked = img.copy()
+    ImageDraw.Draw(marked).rectangle(box, outline=(255, 0, 0), width=max(2, img.width // 300))
+    return save_prediction_plot(marked, image_path, labels, probabilities, output_dir)
+
+TILED_CSV_FIELDS = ['file', 'class', 'confidence', 'tile_x1', 'tile_y1', 'tile_x2', 'tile_y2', 'tiles']
+
+def tiled_predict(model, labels, image_paths, output_dir="output", tile_size=448,
+                  overlap=0.25, batch_size=32, normal_label="良品", save_plots=False):
+    """高解像度画像をタイル分割して予測（小さな傷の検出用）
+
+    重なりのあるタイルをまとめて推論し、クラスごとの最大確率で1枚分の結果にまとめる。
+    normal_label のクラスだけはタイルの最小確率を使うため、どこか1か所でも
+    不良と判定されれば画像全体が不良になる。結果は tiled_results.csv に保存する。
+    """
+    print(f"\n🧩 タイル分割推論: {len(image_paths)}枚"
+          f"（タイル: {tile_size}px, 重なり: {overlap * 100:.0f}%, バッチサイズ: {batch_size}）")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    normal_index = labels.index(normal_label) if normal_label in labels else None
+    if normal_index is None:
+        print(f"⚠️  良品クラス「{normal_label}」がラベルに無いため、全クラスを最大値でまとめます")
+    
+    csv_path = os.path.join(output_dir, "tiled_results.csv")
+    total_tiles = 0
+    processed = 0
+    inference_time = 0.0
+    start_time = time.perf_counter()
+    results = []
     with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['file', 'class', 'confidence'])
+        writer = csv.DictWriter(f, fieldnames=TILED_CSV_FIELDS)
         writer.writeheader()
-        writer.writerows(results)
-    
+        
+        for image_path in image_paths:
+            try:
+                img, positions, tiles = load_tiles(image_path, tile_size, overlap)
+            except Exception as e:
+                print(f"❌ エラー ({os.path.basename(image_path)}): {e}")
+                continue
+            
+            infer_start = time.perf_counter()
+            tile_probabilities = predict_tiles(model, tiles, batch_size)
+            inference_time += time.perf_counter() - infer_start
+            
+            probabilities, source_tiles = merge_tile_scores(tile_probabilities, normal_index)
+            predicted = int(np.argmax(probabilities))
+            box = positions[source_tiles[predicted]]
+            row = {
+                'file': os.path.basename(image_path),
+                'class': labels[predicted],
+                'confidence': float(probabilities[predicted] * 100),
+                'tile_x1': box[0], 'tile_y1': box[1], 'tile_x2': box[2], 'tile_y2': box[3],
+                'tiles': len(positions)
+            }
+            writer.writerow(row)
+            results.append(row)
+            print(f"{row['file']:30} → {row['class']:15} ({row['confidence']:.1f}%)"
+                  f"  タイル{len(positions)}枚, 根拠: {box}")
+            
+            if save_plots:
+                output_path = save_tile_plot(img, box, image_path, labels, probabilities, output_dir)
+                print(f"  💾 {output_path}")
+            
+            total_tiles += len(positions)
+            processed += 1
+    
+    elapsed = time.perf_counter() - start_time
     print(f"\n💾 結果CSVを保存: {csv_path}")
+    if elapsed > 0 and processed:
+        print(f"⏱️  {processed}枚（タイル{total_tiles}枚）/ {elapsed:.2f}秒 = "
+              f"{processed / elapsed:.2f} 枚/秒")
+    if inference_time > 0:
+        print(f"   推論のみ: {total_tiles / inference_time:.1f} タイル/秒"
+              f"（画像あたり平均 {total_tiles / max(processed, 1):.1f} タイル）")
+    return results
 
 def create_sample_data(output_dir="sample_data"):
     """サンプルデータを作成（デモ用）"""
@@ -200,6 +541,77 @@ def main():
         "--batch-dir",
         help="バッチ処理するディレクトリ"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="バッチ処理で1回に推論する枚数 (default: 32)"
+    )
+    parser.add_argument(
+        "--save-plots",
+        action="store_true",
+        help="バッチ処理でも画像ごとの予測グラフを保存する"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="バッチ処理で画像をデコードするスレッド数 (default: CPU数, 最大8)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="既存の batch_results.csv を読み、予測済みの画像をスキップして再開"
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="予測結果をディスクにキャッシュし、同じ画像の再予測を省略する"
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help=f"キャッシュファイルのパス (default: {DEFAULT_CACHE_PATH})"
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=10000,
+        help="キャッシュに保持する最大件数。超えた分は古い順に削除 (default: 10000)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["keras", "tflite"],
+        default="keras",
+        help="推論バックエンド。tflite は初回に変換してキャッシュ (default: keras)"
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATIONS,
+        default="float16",
+        help="TFLiteの量子化方式。int8 は --batch-dir の画像で入出力も整数化 (default: float16)"
+    )
+    parser.add_argument(
+        "--compare-backend",
+        action="store_true",
+        help="--image / --batch-dir の画像でKerasモデルとの精度差・速度を比較"
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        help="指定すると画像をこのサイズ（px）のタイルに分けて予測する（高解像度画像の小さな傷向け）"
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        type=float,
+        default=0.25,
+        help="隣り合うタイルの重なりの割合 (default: 0.25)"
+    )
+    parser.add_argument(
+        "--normal-label",
+        default="良品",
+        help="タイル分割時に良品として扱うクラス名 (default: 良品)"
+    )
     parser.add_argument(
         "--output-dir",
         default="output",
@@ -213,6 +625,15 @@ def main():
     
     args = parser.parse_args()
     
+    if args.batch_size < 1:
+        parser.error("--batch-size は1以上を指定してください")
+    if args.workers < 1:
+        parser.error("--workers は1以上を指定してください")
+    if args.tile_size is not None and args.tile_size < 1:
+        parser.error("--tile-size は1以上を指定してください")
+    if not 0 <= args.tile_overlap < 1:
+        parser.error("--tile-overlap は0以上1未満を指定してください")
+    
     print("🤖 Teachable Machine モデルテスト")
     print("=" * 60)
     
@@ -234,29 +655,77 @@ def main():
         print(f"❌ ラベルファイルが見つかりません: {args.labels_path}")
         return
     
+    # 評価対象の画像（int8量子化の代表データや比較に使う）
+    if args.image:
+        sample_paths = [args.image]
+    elif args.batch_dir and os.path.isdir(args.batch_dir):
+        sample_paths = [os.path.join(args.batch_dir, f) for f in list_image_files(args.batch_dir)]
+    else:
+        sample_paths = []
+    
+    representative_data = None
+    if args.backend == 'tflite' and args.quantization == 'int8' and sample_paths:
+        representative_data = load_images_array(sample_paths[:100])
+    
     # モデルを読み込む
     try:
         model, labels = load_teachable_machine_model(
-            args.model_path, args.labels_path
+            args.model_path, args.labels_path, backend=args.backend,
+            quantization=args.quantization, representative_data=representative_data,
+            warmup_batch_sizes=(1, args.batch_size) if args.batch_dir or args.tile_size else (1,)
         )
     except Exception as e:
         print(f"❌ モデルの読み込みに失敗: {e}")
         return
     
+    # バックエンド比較モード
+    if args.compare_backend:
+        if not sample_paths:
+            print("❌ 比較に使う画像を --image か --batch-dir で指定してください")
+            return
+        report_backend_comparison(
+            args.model_path, model, labels, sample_paths[:1000], args.output_dir,
+            batch_size=args.batch_size, workers=args.workers
+        )
+        return
+    
+    # タイル分割推論モード
+    if args.tile_size:
+        if not sample_paths:
+            print("❌ 予測する画像を --image か --batch-dir で指定してください")
+            return
+        tiled_predict(
+            model, labels, sample_paths, args.output_dir,
+            tile_size=args.tile_size, overlap=args.tile_overlap,
+            batch_size=args.batch_size, normal_label=args.normal_label,
+            save_plots=args.save_plots or bool(args.image)
+        )
+        return
+    
     # 予測実行
     if args.image:
         # 単一画像の予測
         if not os.path.exists(args.image):
             print(f"❌ 画像が見つかりません: {args.image}")
             return
-        predict_image(model, labels, args.image, args.output_dir)
+        cache, model_hash = None, None
+        if args.cache:
+            cache = PredictionCache(args.cache_path, max_entries=args.cache_size)
+            # TFLiteは変換後のファイルをハッシュし、Keras・量子化方式ごとの結果を別々にキャッシュする
+            model_hash = hash_file(model.model_path if args.backend == 'tflite' else args.model_path)
+        predict_image(model, labels, args.image, args.output_dir,
+                      cache=cache, model_hash=model_hash)
     
     elif args.batch_dir:
         # バッチ処理
         if not os.path.exists(args.batch_dir):
             print(f"❌ ディレクトリが見つかりません: {args.batch_dir}")
             return
-        batch_predict(model, labels, args.batch_dir, args.output_dir)
+        batch_predict(
+            model, labels, args.batch_dir, args.output_dir,
+            batch_size=args.batch_size, save_plots=args.save_plots,
+            workers=args.workers, resume=args.resume
+        )
     
     else:
         print("\n⚠️  予測する画像を指定してください")
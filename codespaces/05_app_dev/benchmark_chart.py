@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+信頼度チャート描画のベンチマーク
+従来の matplotlib 図（リクエストごとに新規作成・未解放）と、
+現在の gr.Label 用データ（create_confidence_chart）の1リクエストあたりの時間を比較する
+"""
+
+import os
+import sys
+import time
+import argparse
+import resource
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gradio_app
+
+
+def legacy_confidence_chart(predictions, labels):
+    """従来の実装（matplotlibの図を毎回作成し、閉じずに返す）"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+
+    y_pos = np.arange(len(labels))
+    ax.barh(y_pos, predictions * 100)
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(labels)
+    ax.set_xlabel('確率 (%)')
+    ax.set_title('予測結果の詳細')
+    ax.set_xlim(0, 100)
+
+    max_idx = np.argmax(predictions)
+    ax.barh(max_idx, predictions[max_idx] * 100, color='red')
+
+    plt.tight_layout()
+    return fig
+
+
+def max_rss_mb():
+    """プロセスの最大常駐メモリ（MB, Linux）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench(name, fn, requests):
+    """requests回呼び出して1回あたりの時間（ミリ秒）とメモリ増加を表示"""
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    per_request = (time.perf_counter() - start) / requests * 1000
+    print(f"{name:28} {per_request:8.3f} ms/リクエスト  "
+          f"メモリ増加 {max_rss_mb() - rss_before:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="信頼度チャート描画の速度比較")
+    parser.add_argument("--requests", type=int, default=200, help="リクエスト数 (default: 200)")
+    parser.add_argument("--classes", type=int, default=2, help="クラス数 (default: 2)")
+    args = parser.parse_args()
+
+    labels = [f"class_{i}" for i in range(args.classes)]
+    predictions = np.random.dirichlet(np.ones(args.classes)).astype(np.float32)
+
+    print("⏱️  信頼度チャート描画ベンチマーク")
+    print("=" * 60)
+    bench("gr.Label用データ（現在）",
+          lambda: gradio_app.create_confidence_chart(predictions, labels), args.requests)
+    bench("matplotlib図（従来）",
+          lambda: legacy_confidence_chart(predictions, labels), args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,46 +6,153 @@ Gradio傷検出アプリ開発スクリプト
 
 import os
 import sys
+import io
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
 import gradio as gr
 import numpy as np
 from PIL import Image
-import tensorflow as tf
-from tensorflow import keras
 import json
 from datetime import datetime
-import csv
+
+# 共通ユーティリティ（codespaces/utils）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from utils.prediction_cache import (
+    PredictionCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, hash_image_array
+)
+from utils.micro_batcher import MicroBatcher
+from utils.inference_workers import InferenceWorkerPool
+from utils.history_store import HistoryStore
+from utils.model_registry import ModelRegistry
+from utils.model_warmup import format_warmup
+from utils.metrics import MetricsRegistry, start_metrics_server
+
+# バッチ処理タブで1回に推論する枚数
+BATCH_CHUNK_SIZE = 32
+
+# メトリクス（--metrics-port で /metrics として公開）
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram(
+    'inspection_stage_seconds', '処理段階ごとの所要時間（秒）', ['stage'])
+REQUEST_SECONDS = metrics.histogram(
+    'inspection_request_seconds', 'リクエスト全体の所要時間（秒）', ['endpoint'])
+BATCH_SIZE = metrics.histogram(
+    'inspection_inference_batch_size', '1回の順伝播で推論した枚数',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+PREDICTIONS = metrics.counter(
+    'inspection_predictions_total', '判定結果ごとの検査数', ['label'])
+ERRORS = metrics.counter(
+    'inspection_errors_total', 'エラーになったリクエスト数', ['endpoint'])
+QUEUE_DEPTH = metrics.gauge(
+    'inspection_queue_depth', 'マイクロバッチ・推論ワーカーの待ち行列にあるリクエスト数')
+MODEL_VERSION = metrics.gauge(
+    'inspection_model_version', '現在有効なモデルのバージョン番号')
 
 # グローバル変数
-model = None
-labels = []
-history = []
+registry = ModelRegistry()  # 現在のモデル・ラベルの組（差し替えは registry.load() で行う）
+history = None  # HistoryStore（main() で作成）
+prediction_cache = None
+batcher = None
+worker_pool = None  # InferenceWorkerPool（--workers 指定時）
+
+def describe_version(entry):
+    """モデルのバージョン表示"""
+    return f"v{entry.version}（{os.path.basename(entry.model_path)}, {entry.loaded_at}）"
 
 def load_model(model_path="keras_model.h5", labels_path="labels.txt"):
-    """モデルを読み込む"""
-    global model, labels
+    """モデルを読み込む
+
+    新しいモデルを読み込んでウォームアップしてから差し替えるため、
+    読み込み中も他のリクエストは現在のモデルで処理され続ける。
+    推論ワーカーが有効な場合は、全ワーカーの読み込みが成功してから差し替える。
+    """
+    worker_warmups = []
+    
+    def load_workers(entry):
+        worker_warmups.extend(
+            worker_pool.load(entry.model_path, entry.version, registry.warmup_batch_sizes))
     
     try:
-        # モデルを読み込む
-        model = keras.models.load_model(model_path, compile=False)
-        model.compile(
-            optimizer='adam',
-            loss='categorical_crossentropy',
-            metrics=['accuracy']
-        )
-        
-        # ラベルを読み込む
-        with open(labels_path, 'r', encoding='utf-8') as f:
-            labels = [line.strip() for line in f.readlines()]
-        
-        return f"✅ モデルを読み込みました（クラス: {', '.join(labels)}）"
+        entry = registry.load(model_path, labels_path,
+                              before_publish=load_workers if worker_pool is not None else None)
+        MODEL_VERSION.set(entry.version)
+        if worker_warmups:
+            # 最も遅かったワーカーのウォームアップ結果を表示
+            timings, first_request = max(worker_warmups, key=lambda warmup: warmup[1])
+        else:
+            timings, first_request = entry.warmup_timings, entry.first_request_latency
+        return (f"✅ モデル {describe_version(entry)} を読み込みました"
+                f"（クラス: {', '.join(entry.labels)}）\n"
+                + format_warmup(timings, first_request))
     except Exception as e:
         return f"❌ エラー: {str(e)}"
 
+def to_model_input(batch):
+    """画素値 0〜255 のバッチ (N, 224, 224, 3) をモデル入力（0〜1 のfloat32）に変換"""
+    return np.asarray(batch, dtype=np.float32) / 255.0
+
+def predict_batch(batch, entry=None):
+    """前処理済みのバッチ (N, 224, 224, 3) を1回の順伝播で推論し、確率 (N, C) を返す
+
+    推論ワーカーが有効な場合は、共有メモリ経由でワーカープロセスに推論させる。
+    """
+    if entry is None:
+        entry = registry.current()
+    BATCH_SIZE.observe(len(batch))
+    if worker_pool is not None:
+        return worker_pool.predict(batch, entry.model_path, entry.version)
+    return np.asarray(entry.model(to_model_input(batch), training=False))
+
+def run_inference(img_array, entry):
+    """前処理済みの1枚 (224, 224, 3) の確率 (C,) を entry のモデルで求める
+
+    マイクロバッチが有効な場合は、同じモデルへの他のリクエストとまとめて推論する。
+    """
+    if batcher is not None:
+        return batcher.predict(img_array, entry)
+    return predict_batch(img_array[np.newaxis], entry)[0]
+
+def preprocess(img):
+    """PIL画像をリサイズし、(リサイズ後の画像, (224, 224, 3) のuint8配列) を返す
+
+    0〜1への正規化は推論の直前（to_model_input）で行う。
+    uint8のまま渡すことで、ワーカープロセスとの共有メモリも1/4の大きさで済む。
+    """
+    img = img.convert('RGB').resize((224, 224))
+    return img, np.asarray(img, dtype=np.uint8)
+
+def classify_one(img, img_array, entry):
+    """前処理済みの1枚を推論して確率 (C,) を返す（同じ画像・同じモデルならキャッシュを再利用）"""
+    if prediction_cache is not None:
+        with STAGE_SECONDS.time(stage='cache'):
+            image_hash = hash_image_array(np.asarray(img))
+            cached = prediction_cache.get(entry.model_hash, image_hash)
+        if cached is not None:
+            return cached
+    with STAGE_SECONDS.time(stage='inference'):
+        probabilities = run_inference(img_array, entry)
+    if prediction_cache is not None:
+        prediction_cache.put(entry.model_hash, image_hash, probabilities)
+    return probabilities
+
+def record_result(label, confidence):
+    """判定結果をメトリクスと履歴に記録"""
+    PREDICTIONS.inc(label=label)
+    if history is not None:
+        with STAGE_SECONDS.time(stage='history'):
+            history.add(label, confidence)
+
 def predict_image(image):
     """画像を予測"""
-    global model, labels, history
+    with REQUEST_SECONDS.time(endpoint='predict'):
+        return _predict_image(image)
+
+def _predict_image(image):
+    # リクエストの最後まで同じモデル・ラベルの組を使う（途中で差し替えられても混ざらない）
+    entry = registry.current()
     
-    if model is None:
+    if entry is None:
         return None, "❌ モデルが読み込まれていません", None
     
     if image is None:
@@ -53,13 +160,12 @@ def predict_image(image):
     
     try:
         # 画像を前処理
-        img = Image.fromarray(image)
-        img = img.resize((224, 224))
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
+        with STAGE_SECONDS.time(stage='preprocess'):
+            img, img_array = preprocess(Image.fromarray(image))
         
-        # 予測
-        predictions = model.predict(img_array)
+        # 予測（同じ画像・同じモデルならキャッシュを再利用）
+        predictions = classify_one(img, img_array, entry)[np.newaxis]
+        labels = entry.labels
         predicted_class = np.argmax(predictions[0])
         confidence = predictions[0][predicted_class] * 100
         
@@ -70,13 +176,10 @@ def predict_image(image):
         details = "\n詳細:\n"
         for i, (label, prob) in enumerate(zip(labels, predictions[0])):
             details += f"  {label}: {prob*100:.1f}%\n"
+        details += f"\nモデル: {describe_version(entry)}\n"
         
         # 履歴に追加
-        history.append({
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'result': labels[predicted_class],
-            'confidence': confidence
-        })
+        record_result(labels[predicted_class], confidence)
         
         # 判定結果に応じた色付け
         if labels[predicted_class] == "良品":
@@ -84,83 +187,282 @@ def predict_image(image):
         else:
             result_html = f'<div style="color: red; font-size: 24px; font-weight: bold;">❌ {result_text}</div>'
         
-        return image, result_html + details, create_confidence_chart(predictions[0])
+        with STAGE_SECONDS.time(stage='chart'):
+            chart = create_confidence_chart(predictions[0], labels)
+        
+        return image, result_html + details, chart
         
     except Exception as e:
+        ERRORS.inc(endpoint='predict')
         return None, f"❌ エラー: {str(e)}", None
 
-def create_confidence_chart(predictions):
-    """信頼度のチャートを作成"""
-    import matplotlib.pyplot as plt
-    import matplotlib
-    matplotlib.use('Agg')
-    
-    fig, ax = plt.subplots(figsize=(8, 4))
+def create_confidence_chart(predictions, labels):
+    """信頼度のチャート用データを作成
+
+    gr.Label にクラス名→確率の辞書を渡すと、ブラウザ側で棒グラフとして描画される。
+    matplotlibの図をリクエストごとに作るより軽く、サーバーにメモリも残らない。
+    """
+    return {label: float(prob) for label, prob in zip(labels, predictions)}
+
+def load_batch_image(source):
+    """画像ファイル（パスまたはファイルオブジェクト）を読み込み、(224, 224, 3) のuint8配列を返す"""
+    with Image.open(source) as img:
+        return preprocess(img)[1]
+
+def read_source_bytes(source):
+    """画像ファイル（パスまたはファイルオブジェクト）の中身をデコードせずにバイト列で読む"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source.read()
+
+def classify_in_workers(sources, entry):
+    """エンコード済みの画像を推論ワーカーに渡し、デコード・リサイズ・推論をワーカーで行う
+
+    戻り値は classify_local と同じ ({番号: 確率}, {番号: エラーメッセージ})。
+    """
+    probabilities, errors = {}, {}
+    encoded, indices = [], []
+    for i, source in enumerate(sources):
+        try:
+            encoded.append(read_source_bytes(source))
+            indices.append(i)
+        except Exception as e:
+            errors[i] = str(e)
     
-    y_pos = np.arange(len(labels))
-    ax.barh(y_pos, predictions * 100)
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(labels)
-    ax.set_xlabel('確率 (%)')
-    ax.set_title('予測結果の詳細')
-    ax.set_xlim(0, 100)
+    BATCH_SIZE.observe(len(encoded))
+    with STAGE_SECONDS.time(stage='worker'):
+        outcomes = worker_pool.predict_encoded(encoded, entry.model_path, entry.version)
+    for i, (probs, error) in zip(indices, outcomes):
+        if error is not None:
+            errors[i] = error
+        else:
+            probabilities[i] = probs
+    return probabilities, errors
+
+def classify_local(sources, entry, chunk_size=BATCH_CHUNK_SIZE):
+    """画像のデコードをスレッドで並列に行い、chunk_size枚ずつ1回の順伝播で推論する
+
+    戻り値は ({番号: 確率}, {番号: エラーメッセージ})。
+    """
+    # 画像を並列にデコード
+    decoded = [None] * len(sources)
+    errors = {}
+    with STAGE_SECONDS.time(stage='preprocess'), \
+            ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(load_batch_image, source) for source in sources]
+        for i, future in enumerate(futures):
+            try:
+                decoded[i] = future.result()
+            except Exception as e:
+                errors[i] = str(e)
     
-    # 最大値をハイライト
-    max_idx = np.argmax(predictions)
-    ax.barh(max_idx, predictions[max_idx] * 100, color='red')
+    # 読み込めた画像をまとめて推論
+    ok = [i for i in range(len(sources)) if i not in errors]
+    probabilities = {}
+    for start in range(0, len(ok), chunk_size):
+        indices = ok[start:start + chunk_size]
+        batch = np.stack([decoded[i] for i in indices])
+        with STAGE_SECONDS.time(stage='inference'):
+            batch_probabilities = predict_batch(batch, entry)
+        for i, probs in zip(indices, batch_probabilities):
+            probabilities[i] = probs
+    return probabilities, errors
+
+def classify_images(sources, entry, chunk_size=BATCH_CHUNK_SIZE, endpoint='batch'):
+    """複数の画像をまとめて判定し、画像ごとの結果の辞書のリストを返す
+
+    推論ワーカーが有効な場合はデコードもワーカーで行い、このプロセスはファイルを読んで渡すだけにする。
+    読み込めなかった画像は {'error': メッセージ} になる。
+    """
+    if worker_pool is not None:
+        probabilities, errors = classify_in_workers(sources, entry)
+    else:
+        probabilities, errors = classify_local(sources, entry, chunk_size)
+    if errors:
+        ERRORS.inc(len(errors), endpoint=endpoint)
     
-    plt.tight_layout()
-    return fig
+    results = []
+    for i in range(len(sources)):
+        if i in errors:
+            results.append({'error': errors[i]})
+            continue
+        predicted_class = int(np.argmax(probabilities[i]))
+        confidence = float(probabilities[i][predicted_class] * 100)
+        record_result(entry.labels[predicted_class], confidence)
+        results.append({
+            'label': entry.labels[predicted_class],
+            'confidence': confidence,
+            'probabilities': {
+                label: float(prob) for label, prob in zip(entry.labels, probabilities[i])
+            },
+        })
+    return results
 
-def batch_process(files):
-    """複数ファイルを一括処理"""
-    if model is None:
-        return "❌ モデルが読み込まれていません"
+def batch_process(files, chunk_size=BATCH_CHUNK_SIZE):
+    """複数ファイルを一括処理
+
+    画像のデコードをスレッドで並列に行い、chunk_size枚ずつまとめて推論する。
+    結果は表と、判定結果の割合を示すチャート1つで返す。
+    """
+    with REQUEST_SECONDS.time(endpoint='batch'):
+        return _batch_process(files, chunk_size)
+
+def _batch_process(files, chunk_size):
+    entry = registry.current()
+    if entry is None:
+        return None, None, "❌ モデルが読み込まれていません"
     
     if not files:
-        return "❌ ファイルをアップロードしてください"
+        return None, None, "❌ ファイルをアップロードしてください"
     
-    results = []
-    for file in files:
-        try:
-            # 画像を読み込む
-            img = Image.open(file.name)
-            img_array = np.array(img)
-            
-            # 予測
-            _, result_text, _ = predict_image(img_array)
-            
-            results.append({
-                'file': os.path.basename(file.name),
-                'result': result_text
-            })
-        except Exception as e:
-            results.append({
-                'file': os.path.basename(file.name),
-                'result': f"エラー: {str(e)}"
-            })
+    # Gradioのバージョンによりファイルオブジェクトかパス文字列で渡される
+    paths = [getattr(file, 'name', file) for file in files]
+    results = classify_images(paths, entry, chunk_size)
     
     # 結果を整形
-    output = "バッチ処理結果:\n\n"
-    for r in results:
-        output += f"📄 {r['file']}\n{r['result']}\n\n"
+    rows = []
+    counts = Counter()
+    for path, result in zip(paths, results):
+        filename = os.path.basename(path)
+        if 'error' in result:
+            rows.append([filename, f"エラー: {result['error']}", None])
+            continue
+        rows.append([filename, result['label'], round(result['confidence'], 1)])
+        counts[result['label']] += 1
+    
+    ok = sum(counts.values())
+    errors = len(paths) - ok
+    summary_chart = {label: counts[label] / ok for label in entry.labels} if ok else None
+    summary = f"✅ {ok}枚を処理しました" + (f"（エラー {errors}枚）" if errors else "")
+    summary += f" / モデル: {describe_version(entry)}"
+    
+    return rows, summary_chart, summary
+
+def decode_image_bytes(data):
+    """画像のバイト列（JPEG/PNG等）をデコードして前処理する（REST API用）
+
+    画像として読めないデータは ValueError にする（APIでは 400 を返す）。
+    """
+    try:
+        with STAGE_SECONDS.time(stage='preprocess'):
+            with Image.open(io.BytesIO(data)) as img:
+                return preprocess(img)
+    except Exception as e:
+        raise ValueError(f"画像を読み込めません: {e}") from e
+
+def predict_decoded(img, img_array, entry):
+    """デコード済みの画像を判定し、JSONで返す辞書を作る（REST API用）"""
+    probabilities = classify_one(img, img_array, entry)
+    
+    predicted_class = int(np.argmax(probabilities))
+    confidence = float(probabilities[predicted_class] * 100)
+    record_result(entry.labels[predicted_class], confidence)
+    
+    return {
+        'label': entry.labels[predicted_class],
+        'confidence': confidence,
+        'probabilities': {
+            label: float(prob) for label, prob in zip(entry.labels, probabilities)
+        },
+        'model_version': entry.version,
+    }
+
+def create_api_app():
+    """PLCやラインカメラ向けのREST APIを作成
+
+    POST /api/predict       : リクエストボディに画像のバイト列（JPEG等）をそのまま送る
+    POST /api/predict/batch : multipart/form-data で複数の画像（フィールド名 files）を送る
+    GET  /api/health        : モデルの読み込み状態
+    GET  /api/history/recent: 直近の検査履歴（新しい順、?limit=件数）
+    GradioのUIと同じモデル（registry）を使い、base64やGradioの画像コンポーネントを経由しない。
+    画像として読めない入力は 400、モデル未読み込みは 503、推論の失敗は 500 を返す。
+    """
+    from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+    from starlette.concurrency import run_in_threadpool
+    
+    app = FastAPI(title="傷検出AI API")
     
-    return output
+    @app.get("/api/health")
+    def health():
+        entry = registry.current()
+        return {
+            'status': 'ok' if entry is not None else 'no_model',
+            'model_version': entry.version if entry is not None else None,
+        }
+    
+    @app.get("/api/history/recent")
+    def history_recent(limit: int = RECENT_HISTORY_ROWS):
+        return {'results': recent_history(max(0, limit))}
+    
+    @app.post("/api/predict")
+    async def predict(request: Request):
+        data = await request.body()
+        if not data:
+            raise HTTPException(status_code=400, detail="画像データがありません")
+        entry = registry.current()
+        if entry is None:
+            raise HTTPException(status_code=503, detail="モデルが読み込まれていません")
+        with REQUEST_SECONDS.time(endpoint='api'):
+            # デコードと推論はイベントループを止めないようスレッドで実行
+            try:
+                img, img_array = await run_in_threadpool(decode_image_bytes, data)
+            except ValueError as e:
+                ERRORS.inc(endpoint='api')
+                raise HTTPException(status_code=400, detail=str(e))
+            try:
+                return await run_in_threadpool(predict_decoded, img, img_array, entry)
+            except Exception as e:
+                ERRORS.inc(endpoint='api')
+                raise HTTPException(status_code=500, detail=f"推論に失敗しました: {e}")
+    
+    @app.post("/api/predict/batch")
+    def predict_batch_api(files: list[UploadFile] = File(...)):
+        entry = registry.current()
+        if entry is None:
+            raise HTTPException(status_code=503, detail="モデルが読み込まれていません")
+        with REQUEST_SECONDS.time(endpoint='api_batch'):
+            # 読めない画像は画像ごとの error になり、推論自体の失敗だけを 500 にする
+            try:
+                results = classify_images([f.file for f in files], entry, endpoint='api_batch')
+            except Exception as e:
+                ERRORS.inc(endpoint='api_batch')
+                raise HTTPException(status_code=500, detail=f"推論に失敗しました: {e}")
+        for f, result in zip(files, results):
+            result['file'] = f.filename
+        return {'model_version': entry.version, 'results': results}
+    
+    return app
+
+RECENT_HISTORY_ROWS = 50  # 履歴タブに表示する直近の件数
+
+def recent_history(n=RECENT_HISTORY_ROWS):
+    """直近の検査履歴（新しい順）。メモリ上のリングバッファから返すためDBを読まない"""
+    if history is None:
+        return []
+    return list(reversed(history.recent(n)))
 
-def export_history():
-    """履歴をCSVでエクスポート"""
-    if not history:
+def recent_history_rows():
+    """直近の検査履歴を表の行にする（履歴タブ用）"""
+    return [[row['timestamp'], row['result'], round(row['confidence'], 1)] for row in recent_history()]
+
+def export_history(start=None, end=None, result=None):
+    """履歴をCSVでエクスポート（期間・判定結果で絞り込み可）"""
+    if history is None:
         return None, "履歴がありません"
     
-    # CSVファイルを作成
-    filename = f"inspection_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    start = (start or "").strip() or None
+    end = (end or "").strip() or None
+    result = (result or "").strip() or None
+    
+    if history.count(start, end, result) == 0:
+        return None, "該当する履歴がありません"
     
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['timestamp', 'result', 'confidence'])
-        writer.writeheader()
-        writer.writerows(history)
+    # CSVファイルを作成（DBから1行ずつ書き出す）
+    filename = f"inspection_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    count = history.export_csv(filename, start, end, result)
     
-    return filename, f"✅ 履歴を{filename}にエクスポートしました"
+    return filename, f"✅ 履歴{count}件を{filename}にエクスポートしました"
 
 def create_demo_interface():
     """デモ用インターフェースを作成"""
@@ -180,7 +482,7 @@ def create_demo_interface():
                 with gr.Column():
                     output_image = gr.Image(label="検査済み画像")
                     result_text = gr.HTML(label="判定結果")
-                    confidence_chart = gr.Plot(label="信頼度チャート")
+                    confidence_chart = gr.Label(label="信頼度チャート", num_top_classes=10)
             
             check_btn.click(
                 predict_image,
@@ -194,25 +496,42 @@ def create_demo_interface():
                 file_count="multiple"
             )
             batch_btn = gr.Button("📦 一括処理開始", variant="primary")
-            batch_result = gr.Textbox(
-                label="処理結果",
-                lines=10
-            )
+            batch_status = gr.Textbox(label="処理状況")
+            with gr.Row():
+                batch_table = gr.Dataframe(
+                    headers=["ファイル", "判定", "信頼度 (%)"],
+                    label="処理結果"
+                )
+                batch_chart = gr.Label(label="判定結果の割合", num_top_classes=10)
             
             batch_btn.click(
                 batch_process,
                 inputs=[batch_files],
-                outputs=[batch_result]
+                outputs=[batch_table, batch_chart, batch_status]
             )
         
         with gr.Tab("履歴・設定"):
+            gr.Markdown("### 直近の検査")
+            recent_btn = gr.Button("🔄 更新")
+            recent_table = gr.Dataframe(
+                headers=["日時", "判定", "信頼度 (%)"],
+                label=f"直近{RECENT_HISTORY_ROWS}件（新しい順）"
+            )
+            recent_btn.click(recent_history_rows, outputs=[recent_table])
+            demo.load(recent_history_rows, outputs=[recent_table])
+            
             gr.Markdown("### 検査履歴")
+            with gr.Row():
+                export_start = gr.Textbox(label="開始日時（例: 2024-04-01）")
+                export_end = gr.Textbox(label="終了日時（例: 2024-04-30 18:00:00）")
+                export_filter = gr.Textbox(label="判定結果で絞り込み（例: 不良品）")
             export_btn = gr.Button("📥 履歴をエクスポート")
             export_result = gr.Textbox(label="エクスポート結果")
             export_file = gr.File(label="ダウンロード")
             
             export_btn.click(
                 export_history,
+                inputs=[export_start, export_end, export_filter],
                 outputs=[export_file, export_result]
             )
             
@@ -226,7 +545,8 @@ def create_demo_interface():
                 if model_f is None or labels_f is None:
                     return "ファイルを選択してください"
                 
-                return load_model(model_f.name, labels_f.name)
+                # Gradioのバージョンによりファイルオブジェクトかパス文字列で渡される
+                return load_model(getattr(model_f, 'name', model_f), getattr(labels_f, 'name', labels_f))
             
             load_btn.click(
                 load_uploaded_model,
@@ -248,8 +568,75 @@ def create_demo_interface():
 
 def main():
     """メイン処理"""
+    global prediction_cache, batcher, history, worker_pool
+    
+    parser = argparse.ArgumentParser(description="Gradio傷検出AIアプリ")
+    parser.add_argument("--port", type=int, default=7860, help="ポート番号 (default: 7860)")
+    parser.add_argument(
+        "--max-batch-size", type=int, default=8,
+        help="同時リクエストを1回の推論にまとめる最大枚数。1でバッチ処理なし (default: 8)"
+    )
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=5.0,
+        help="後続のリクエストを待つ最大時間（ミリ秒） (default: 5)"
+    )
+    parser.add_argument(
+        "--history-db", default="inspection_history.sqlite3",
+        help="検査履歴を保存するSQLiteファイル (default: inspection_history.sqlite3)"
+    )
+    parser.add_argument(
+        "--history-memory", type=int, default=1000,
+        help="メモリ上に保持する直近の履歴件数。履歴タブと /api/history/recent はここから返す (default: 1000)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="予測結果のキャッシュを使わない"
+    )
+    parser.add_argument(
+        "--cache-path", default=DEFAULT_CACHE_PATH,
+        help=f"キャッシュファイルのパス。test_model.py --cache-path と同じにすると結果を共有 "
+             f"(default: {DEFAULT_CACHE_PATH})"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+        help=f"キャッシュに保持する最大件数。超えた分は古い順に削除 (default: {DEFAULT_MAX_ENTRIES})"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=9100,
+        help="Prometheus形式のメトリクスを http://127.0.0.1:PORT/metrics で公開。0で無効 (default: 9100)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=0,
+        help="推論を行うワーカープロセス数。各プロセスがモデルを読み込む。0でこのプロセス内で推論 (default: 0)"
+    )
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="Gradio UIを起動せず、REST API（/api/predict など）だけを提供する"
+    )
+    args = parser.parse_args()
+    
     print("🚀 傷検出AIアプリを起動します")
     
+    # 実際に使うバッチサイズ（単一画像・マイクロバッチ・バッチ処理タブ）でウォームアップする
+    registry.warmup_batch_sizes = tuple(sorted({1, max(1, args.max_batch_size), BATCH_CHUNK_SIZE}))
+    
+    # 検査履歴（再起動しても残る）
+    history = HistoryStore(args.history_db, recent_size=args.history_memory)
+    
+    # 予測キャッシュ（test_model.py --cache と同じファイルを共有）
+    if not args.no_cache:
+        try:
+            prediction_cache = PredictionCache(args.cache_path, max_entries=args.cache_size)
+        except Exception as e:
+            print(f"⚠️  予測キャッシュを利用できません: {e}")
+    
+    # 推論ワーカープロセス（モデルを読み込む前に起動しておく）
+    if args.workers > 0:
+        worker_pool = InferenceWorkerPool(args.workers, slot_size=BATCH_CHUNK_SIZE)
+        # 推論はワーカーに任せ、このプロセスではモデルを読み込まない
+        registry.load_in_process = False
+        print(f"🧵 推論ワーカー: {args.workers}プロセス")
+    
     # デフォルトモデルの読み込みを試みる
     if os.path.exists("keras_model.h5") and os.path.exists("labels.txt"):
         result = load_model()
@@ -258,21 +645,57 @@ def main():
         print("⚠️  デフォルトモデルが見つかりません")
         print("アプリ内でモデルをアップロードしてください")
     
-    # デモを作成して起動
-    demo = create_demo_interface()
-    
-    # ローカルURLを表示
-    print("\n" + "="*50)
-    print("アプリが起動しました！")
-    print("ブラウザで以下のURLにアクセスしてください:")
-    print("http://localhost:7860")
-    print("="*50 + "\n")
+    # 同時リクエストをまとめて推論するマイクロバッチ
+    if args.max_batch_size > 1:
+        # ワーカーが複数ある場合は、各ワーカーに同時にバッチを渡せるようスレッドを揃える
+        batcher = MicroBatcher(
+            predict_batch, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+            num_threads=max(1, args.workers)
+        )
+        print(f"📦 マイクロバッチ: 最大{args.max_batch_size}枚 / 待ち時間{args.max_wait_ms}ms")
     
-    demo.launch(
-        server_name="0.0.0.0",
-        server_port=7860,
-        share=False  # Trueにすると公開URLを生成
+    # メトリクス
+    QUEUE_DEPTH.set_function(
+        lambda: (batcher.qsize() if batcher is not None else 0)
+        + (worker_pool.qsize() if worker_pool is not None else 0)
     )
+    if args.metrics_port:
+        try:
+            start_metrics_server(metrics, args.metrics_port)
+            print(f"📈 メトリクス: http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            print(f"⚠️  メトリクスサーバーを起動できません: {e}")
+    
+    import uvicorn
+    
+    # REST API（PLC・ラインカメラ向け）
+    app = create_api_app()
+    
+    if args.headless:
+        print("\n" + "="*50)
+        print("REST APIサーバーを起動しました（UIなし）")
+        print(f"http://localhost:{args.port}/api/predict")
+        print("="*50 + "\n")
+    else:
+        # デモを作成し、REST APIと同じサーバーに載せる
+        demo = create_demo_interface()
+        # バッチにまとめられるよう、同時に処理するリクエスト数を揃える
+        demo.queue(default_concurrency_limit=max(1, args.max_batch_size))
+        app = gr.mount_gradio_app(app, demo, path="/")
+        
+        # ローカルURLを表示
+        print("\n" + "="*50)
+        print("アプリが起動しました！")
+        print("ブラウザで以下のURLにアクセスしてください:")
+        print(f"http://localhost:{args.port}")
+        print(f"REST API: http://localhost:{args.port}/api/predict")
+        print("="*50 + "\n")
+    
+    try:
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
+    finally:
+        if worker_pool is not None:
+            worker_pool.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+codespaces 各実習スクリプトで共有する共通ユーティリティ
+"""
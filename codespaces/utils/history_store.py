@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+検査履歴の保存
+SQLite（WALモード）に永続化し、直近の履歴だけをメモリ上のリングバッファに保持する
+"""
+
+import os
+import csv
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+
+HISTORY_FIELDS = ['timestamp', 'result', 'confidence']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class HistoryStore:
+    """検査履歴ストア
+
+    path: SQLiteファイルのパス
+    recent_size: メモリ上に保持する直近の件数（これを超えた古いものはDBのみに残る）
+    """
+
+    def __init__(self, path="inspection_history.sqlite3", recent_size=1000):
+        self.path = path
+        self._recent = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                result TEXT NOT NULL,
+                confidence REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_history_result ON history (result, timestamp)"
+        )
+        self._conn.commit()
+
+        # 再起動時は直近の履歴をDBから復元
+        rows = self._conn.execute(
+            "SELECT timestamp, result, confidence FROM history ORDER BY id DESC LIMIT ?",
+            (recent_size,)
+        ).fetchall()
+        for row in reversed(rows):
+            self._recent.append(dict(zip(HISTORY_FIELDS, row)))
+
+    def add(self, result, confidence, timestamp=None):
+        """1件追加"""
+        if timestamp is None:
+            timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+        entry = {'timestamp': timestamp, 'result': result, 'confidence': float(confidence)}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO history (timestamp, result, confidence) VALUES (?, ?, ?)",
+                (timestamp, result, entry['confidence'])
+            )
+            self._conn.commit()
+            self._recent.append(entry)
+        return entry
+
+    def recent(self, n=None):
+        """メモリ上の直近の履歴（古い順）。n件より多くは保持していない場合はあるだけ返す"""
+        with self._lock:
+            items = list(self._recent)
+        return items if n is None else items[max(0, len(items) - n):]
+
+    def _where(self, start=None, end=None, result=None):
+        """検索条件のWHERE句とパラメータ（start/endは 'YYYY-MM-DD[ HH:MM:SS]' 形式）"""
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            # 日付だけの指定はその日の終わりまでを含める
+            if len(end) == 10:
+                end = f"{end} 23:59:59"
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if result:
+            clauses.append("result = ?")
+            params.append(result)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def count(self, start=None, end=None, result=None):
+        """条件に一致する件数"""
+        where, params = self._where(start, end, result)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    def query(self, start=None, end=None, result=None, limit=None):
+        """期間・判定結果で検索し、1件ずつ dict を返すジェネレータ"""
+        where, params = self._where(start, end, result)
+        sql = f"SELECT timestamp, result, confidence FROM history{where} ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        # 書き込みと競合しないよう、読み出しは専用の接続で行う
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            for row in conn.execute(sql, params):
+                yield dict(zip(HISTORY_FIELDS, row))
+        finally:
+            conn.close()
+
+    def export_csv(self, path, start=None, end=None, result=None):
+        """条件に一致する履歴をCSVへ書き出し、件数を返す（全件をメモリに載せない）"""
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+            writer.writeheader()
+            for row in self.query(start, end, result):
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+マルチプロセス推論ワーカー
+N個のワーカープロセスがそれぞれモデルを1度だけ読み込み、共有キューから推論タスクを受け取る。
+前処理済みの画像は共有メモリ上のバッファ（スロット）に書き込んで渡すため、pickleでコピーしない。
+エンコード済みの画像（JPEG等のバイト列）を渡すと、デコードとリサイズもワーカーで行う。
+"""
+
+import io
+import os
+import queue
+import itertools
+import threading
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import Future, wait
+import numpy as np
+
+# 1つのワーカーが保持するモデルのバージョン数（差し替え中の旧バージョンのリクエスト用）
+KEEP_VERSIONS = 2
+
+
+def _load_worker_model(model_path, warmup_batch_sizes):
+    """ワーカー内でモデルを読み込み、ウォームアップする。(モデル, warm_up の結果) を返す"""
+    from tensorflow import keras
+    from utils.model_warmup import TracedModel, warm_up
+
+    # 推論のみなので compile() は不要
+    model = TracedModel(keras.models.load_model(model_path, compile=False))
+    return model, warm_up(model, warmup_batch_sizes)
+
+
+def _decode_image(data, image_shape):
+    """JPEG/PNG等のバイト列をデコードし、image_shape (H, W, 3) のuint8配列にする
+
+    gradio_app.preprocess と同じ前処理（RGB変換してリサイズ）。
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert('RGB').resize((image_shape[1], image_shape[0]))
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _worker_main(shm_name, buffer_shape, input_scale, threads, tasks, results, barrier):
+    """ワーカープロセスの本体"""
+    import tensorflow as tf
+
+    # 全ワーカーがすべてのコアを取り合わないよう、TFのスレッド数を分け合う
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    shm = SharedMemory(name=shm_name)
+    buffers = np.ndarray(buffer_shape, dtype=np.uint8, buffer=shm.buf)
+    models = {}
+
+    def load_model(model_path, version, warmup_batch_sizes=(1,)):
+        model, warmup = _load_worker_model(model_path, warmup_batch_sizes)
+        models[version] = model
+        # 古いバージョンから捨てる。差し替え中のリクエストのために古いバージョンを
+        # 読み直した場合も、いま読み込んだバージョン自体は捨てない
+        others = sorted(v for v in models if v != version)
+        for old in others[:max(0, len(others) - (KEEP_VERSIONS - 1))]:
+            del models[old]
+        return model, warmup
+
+    def get_model(model_path, version):
+        model = models.get(version)
+        if model is None:
+            model, _ = load_model(model_path, version)
+        return model
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            kind, task_id = task[0], task[1]
+            try:
+                if kind == 'load':
+                    model_path, version, warmup_batch_sizes = task[2:]
+                    try:
+                        _, warmup = load_model(model_path, version, warmup_batch_sizes)
+                        results.put((task_id, warmup, None))
+                    finally:
+                        # 全ワーカーが読み込むまで待つ（1つのワーカーが2回読み込みを受け取らないように）。
+                        # 読み込みに失敗しても必ず待ち合わせ、他のワーカーを待たせたままにしない
+                        barrier.wait()
+                    continue
+                if kind == 'predict_encoded':
+                    encoded, model_path, version = task[2:]
+                    batch = np.empty((len(encoded), *buffer_shape[2:]), dtype=np.uint8)
+                    ok, errors = [], {}
+                    for i, data in enumerate(encoded):
+                        try:
+                            batch[len(ok)] = _decode_image(data, buffer_shape[2:])
+                            ok.append(i)
+                        except Exception as e:
+                            errors[i] = str(e)
+                    probabilities = None
+                    if ok:
+                        batch = batch[:len(ok)].astype(np.float32) * input_scale
+                        probabilities = np.asarray(get_model(model_path, version)(batch, training=False))
+                    results.put((task_id, (ok, probabilities, errors), None))
+                    continue
+                slot, n, model_path, version = task[2:]
+                batch = buffers[slot, :n].astype(np.float32) * input_scale
+                probabilities = np.asarray(get_model(model_path, version)(batch, training=False))
+                results.put((task_id, probabilities, None))
+            except Exception as e:
+                results.put((task_id, None, f"{type(e).__name__}: {e}"))
+    finally:
+        del buffers
+        shm.close()
+
+
+class InferenceWorkerPool:
+    """複数のワーカープロセスで推論するプール
+
+    num_workers: ワーカープロセス数（各プロセスがモデルを1つずつ保持する）
+    image_shape: 1枚の画像の形状（uint8で共有メモリに置く）
+    slot_size: 1回のタスクで推論する最大枚数（これを超えるバッチは分割される）
+    input_scale: uint8の画素値に掛けてモデル入力にする係数
+    """
+
+    def __init__(self, num_workers, image_shape=(224, 224, 3), slot_size=32,
+                 input_scale=1.0 / 255.0):
+        self.num_workers = num_workers
+        self.slot_size = slot_size
+        # 全ワーカーが推論中でも次のバッチを書き込めるよう、スロットはワーカー数の2倍
+        num_slots = num_workers * 2
+        buffer_shape = (num_slots, slot_size, *image_shape)
+        self._shm = SharedMemory(create=True, size=int(np.prod(buffer_shape)))
+        self._buffers = np.ndarray(buffer_shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._free_slots = queue.Queue()
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+
+        # TensorFlowを読み込んだプロセスからforkすると不安定なため spawn で起動する
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        # 子プロセスが起動し終わる前に解放されないよう、属性として保持しておく
+        self._barrier = context.Barrier(num_workers)
+        threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self._processes = [
+            context.Process(
+                target=_worker_main,
+                args=(self._shm.name, buffer_shape, input_scale, threads,
+                      self._tasks, self._results, self._barrier),
+                name=f"inference-worker-{i}", daemon=True
+            )
+            for i in range(num_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+
+    def _submit(self, task, slot=None):
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending[task_id] = (future, slot)
+        self._tasks.put((task[0], task_id, *task[1:]))
+        return future
+
+    def _collect(self):
+        """ワーカーからの結果を受け取り、対応する Future に渡す"""
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            task_id, result, error = item
+            with self._lock:
+                future, slot = self._pending.pop(task_id)
+            if slot is not None:
+                self._free_slots.put(slot)
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def load(self, model_path, version, warmup_batch_sizes=(1,)):
+        """全ワーカーに model_path を version として読み込ませ、ウォームアップが終わるまで待つ
+
+        ワーカーごとの warm_up の結果 (timings, first_request) のリストを返す。
+        1つでも読み込みに失敗したワーカーがあれば、全ワーカーの完了を待ってから RuntimeError を送出する。
+        """
+        futures = [
+            self._submit(('load', model_path, version, tuple(warmup_batch_sizes)))
+            for _ in range(self.num_workers)
+        ]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def submit(self, batch, model_path, version):
+        """uint8の画像バッチ (N, H, W, 3) を投入し、確率 (N, C) を返す Future のリストを受け取る
+
+        slot_size枚ごとに1タスクとなり、空いているワーカーが並列に処理する。
+        ワーカーがまだ読み込んでいない version は、最初のタスクを受け取ったときに読み込まれる。
+        """
+        futures = []
+        for start in range(0, len(batch), self.slot_size):
+            chunk = batch[start:start + self.slot_size]
+            # 空きスロットを待ってから共有メモリに書き込む（ワーカーへはスロット番号だけを送る）
+            slot = self._free_slots.get()
+            self._buffers[slot, :len(chunk)] = chunk
+            futures.append(self._submit(('predict', slot, len(chunk), model_path, version), slot))
+        return futures
+
+    def predict(self, batch, model_path, version, timeout=None):
+        """uint8の画像バッチ (N, H, W, 3) を推論して確率 (N, C) を返す"""
+        futures = self.submit(batch, model_path, version)
+        return np.concatenate([future.result(timeout) for future in futures])
+
+    def predict_encoded(self, images, model_path, version, timeout=None):
+        """エンコード済みの画像（JPEG/PNG等のバイト列）のリストを、デコードから推論までワーカーで処理する
+
+        呼び出し側のプロセスでは画像を展開しないため、PILのデコード・リサイズがGILを取り合わない。
+        画像ごとに (確率 (C,), None) または読み込めなかった場合は (None, エラーメッセージ) のリストを返す。
+        """
+        futures = [
+            self._submit(('predict_encoded', list(images[start:start + self.slot_size]),
+                          model_path, version))
+            for start in range(0, len(images), self.slot_size)
+        ]
+        outcomes = []
+        for future in futures:
+            ok, probabilities, errors = future.result(timeout)
+            chunk = [(None, errors.get(i)) for i in range(len(ok) + len(errors))]
+            for k, i in enumerate(ok):
+                chunk[i] = (probabilities[k], None)
+            outcomes.extend(chunk)
+        return outcomes
+
+    def qsize(self):
+        """処理待ち・処理中のタスク数"""
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        """ワーカーを停止し、共有メモリを解放"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._results.put(None)
+        self._collector.join()
+        del self._buffers
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+推論リクエストのマイクロバッチ処理
+同時に届いたリクエストを短時間だけ待ってまとめ、1回の順伝播で推論して結果を振り分ける
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import numpy as np
+
+
+class MicroBatcher:
+    """複数スレッドからの1枚ずつの推論を、まとめて predict_fn に渡すキュー
+
+    predict_fn: (N, H, W, 3) の配列と context を受け取り (N, C) の確率を返す関数
+    max_batch_size: 1回の順伝播にまとめる最大枚数
+    max_wait_ms: 最初のリクエストが届いてから後続を待つ最大時間（ミリ秒）
+    num_threads: バッチを組んで predict_fn を呼ぶスレッド数
+        （predict_fn が推論ワーカープロセスへ振り分ける場合に、複数のバッチを同時に処理する）
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, num_threads=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"micro-batcher-{i}", daemon=True)
+            for i in range(num_threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, image, context=None):
+        """前処理済みの1枚 (H, W, 3) を投入し、確率 (C,) を返す Future を受け取る
+
+        context（使用するモデルのバージョン等）が同じリクエストだけが同じバッチにまとめられ、
+        predict_fn(batch, context) として渡される。
+        """
+        future = Future()
+        self._queue.put((image, context, future))
+        return future
+
+    def predict(self, image, context=None, timeout=None):
+        """1枚を推論して確率 (C,) を返す（他のリクエストとまとめて実行される）"""
+        return self.submit(image, context).result(timeout)
+
+    def qsize(self):
+        """待機中のリクエスト数"""
+        return self._queue.qsize()
+
+    def close(self):
+        """バッチ処理スレッドを停止"""
+        self._stopped.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _collect(self):
+        """最初の1件を待ち、その後 max_wait 以内に届いた分を max_batch_size まで集める"""
+        first = self._queue.get()
+        if first is None:
+            return []
+        items = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped.set()
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while not self._stopped.is_set():
+            items = self._collect()
+            if not items:
+                continue
+            # 呼び出し側がキャンセルしたものは除き、context ごとに分ける
+            groups = {}
+            for image, context, future in items:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(id(context), (context, []))[1].append((image, future))
+            for context, group in groups.values():
+                self._run_group(context, group)
+
+    def _run_group(self, context, group):
+        """同じ context のリクエストを1回の順伝播で推論し、結果を各 Future に渡す"""
+        try:
+            batch = np.stack([image for image, _ in group]).astype(np.float32, copy=False)
+            probabilities = np.asarray(self.predict_fn(batch, context))
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for i, (_, future) in enumerate(group):
+            future.set_result(probabilities[i])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+バージョン付きモデルレジストリ
+新しいモデルを読み込み・ウォームアップしてから一度に差し替え、
+推論中のリクエストは読み込み時点のバージョンのまま最後まで処理できるようにする
+"""
+
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from utils.prediction_cache import hash_file
+from utils.model_warmup import TracedModel, warm_up
+
+# モデル・ラベル・ハッシュを1つの不変な組として扱い、ばらばらに差し替わらないようにする
+ModelVersion = namedtuple(
+    'ModelVersion',
+    ['version', 'model', 'labels', 'model_hash', 'model_path', 'loaded_at',
+     'warmup_timings', 'first_request_latency']
+)
+
+
+def read_labels(labels_path):
+    """labels.txt を読み込む"""
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f.readlines()]
+
+
+class ModelRegistry:
+    """現在有効なモデルを保持するレジストリ
+
+    current() で取得した ModelVersion を推論の最後まで使えば、
+    途中で load() による差し替えが起きても古いモデルとラベルの組で完了する。
+    """
+
+    def __init__(self, warmup_batch_sizes=(1,), load_in_process=True):
+        # 差し替え前にウォームアップするバッチサイズ（実際に使うサイズを設定しておく）
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        # False のときはこのプロセスにモデルを読み込まない（推論ワーカーに任せる場合）
+        self.load_in_process = load_in_process
+        self._current = None
+        self._next_version = 1
+        self._lock = threading.Lock()
+        # 読み込み自体は重いので、同時に複数の差し替えが走らないよう別のロックで直列化
+        self._load_lock = threading.Lock()
+
+    def current(self):
+        """現在のモデル（未読み込みなら None）"""
+        return self._current
+
+    def load(self, model_path, labels_path, before_publish=None):
+        """モデルを読み込み、ウォームアップしてから差し替える。新しい ModelVersion を返す
+
+        before_publish(entry) は差し替え直前に呼ばれる（推論ワーカーへの読み込みなど）。
+        例外が発生した場合は差し替えず、current() は元のバージョンのままになる。
+        load_in_process=False のときは entry.model が None になる。
+        """
+        with self._load_lock:
+            model, timings, first_request = None, {}, None
+            if self.load_in_process:
+                # TensorFlowはモデルを読み込むときに初めてimportする（起動時間短縮）
+                from tensorflow import keras
+
+                # 推論のみなので compile() は不要
+                model = TracedModel(keras.models.load_model(model_path, compile=False))
+                # 差し替え前にトレースとウォームアップを済ませ、最初のリクエストが遅くならないようにする
+                timings, first_request = warm_up(model, self.warmup_batch_sizes)
+            labels = read_labels(labels_path)
+            model_hash = hash_file(model_path)
+
+            with self._lock:
+                version = self._next_version
+                self._next_version += 1
+            entry = ModelVersion(
+                version=version,
+                model=model,
+                labels=labels,
+                model_hash=model_hash,
+                model_path=os.path.abspath(model_path),
+                loaded_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                warmup_timings=timings,
+                first_request_latency=first_request,
+            )
+            if before_publish is not None:
+                before_publish(entry)
+
+            with self._lock:
+                self._current = entry
+        return entry
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+モデルのウォームアップと推論関数のトレース
+最初の推論で発生する tf.function のトレースやメモリ確保を起動時に済ませておく
+"""
+
+import time
+import numpy as np
+
+
+class TracedModel:
+    """Kerasモデルの推論を tf.function でトレースしたラッパー
+
+    バッチ次元を None にした入力シグネチャで1度だけトレースするため、
+    バッチサイズが変わっても再トレースされない。Kerasモデルと同じく
+    predict() / model(x, training=False) で呼び出せる。
+    """
+
+    def __init__(self, keras_model):
+        import tensorflow as tf
+
+        self.keras_model = keras_model
+        self.input_shape = tuple(int(d) for d in keras_model.input_shape[1:])
+        self._infer = tf.function(
+            lambda x: keras_model(x, training=False),
+            input_signature=[tf.TensorSpec([None, *self.input_shape], tf.float32)]
+        )
+
+    def predict(self, batch, verbose=None):
+        return self._infer(np.asarray(batch, dtype=np.float32)).numpy()
+
+    def __call__(self, batch, training=False):
+        return self.predict(batch)
+
+
+def warm_up(model, batch_sizes=(1,), input_shape=None):
+    """各バッチサイズでダミー入力を推論し、ウォームアップの所要時間と初回リクエスト相当の時間を返す
+
+    戻り値: ({バッチサイズ: 秒}, ウォームアップ後の1枚の推論時間（秒）)
+    """
+    if input_shape is None:
+        input_shape = model.input_shape
+        if len(input_shape) == 4:
+            input_shape = input_shape[1:]
+    input_shape = tuple(int(d) for d in input_shape)
+
+    timings = {}
+    for batch_size in sorted(set(batch_sizes)):
+        dummy = np.zeros((batch_size, *input_shape), dtype=np.float32)
+        start = time.perf_counter()
+        model(dummy, training=False)
+        timings[batch_size] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model(np.zeros((1, *input_shape), dtype=np.float32), training=False)
+    first_request = time.perf_counter() - start
+    return timings, first_request
+
+
+def format_warmup(timings, first_request):
+    """ウォームアップ結果のログ用文字列"""
+    parts = ", ".join(f"batch={bs}: {sec * 1000:.0f}ms" for bs, sec in timings.items())
+    return f"🔥 ウォームアップ完了（{parts}）/ 初回リクエスト相当: {first_request * 1000:.1f}ms"
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+予測結果のディスクキャッシュ
+test_model.py と gradio_app.py で共有し、同じ画像の再検査で推論を省略する
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "vision-sys", "predictions.sqlite3"
+)
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """ファイル内容のSHA-256（モデルファイルの識別に使う）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_image_array(img_array):
+    """画像のピクセル内容のSHA-256
+
+    CLIとGradioで入力経路（ファイル / アップロード）が違っても同じキーになるよう、
+    リサイズ後・正規化前の uint8 配列に対して計算する。
+    """
+    arr = np.ascontiguousarray(img_array)
+    digest = hashlib.sha256()
+    digest.update(f"{arr.shape}{arr.dtype}".encode())
+    digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """(モデルハッシュ, 画像ハッシュ) → クラス確率 のLRUキャッシュ（SQLite）"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS predictions (
+                model_hash TEXT NOT NULL,
+                image_hash TEXT NOT NULL,
+                probabilities BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model_hash, image_hash)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_predictions_last_used ON predictions (last_used)"
+        )
+        self._conn.commit()
+
+    def get(self, model_hash, image_hash):
+        """キャッシュ済みの確率（float32配列）を返す。無ければ None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT probabilities FROM predictions WHERE model_hash = ? AND image_hash = ?",
+                (model_hash, image_hash)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE predictions SET last_used = ? WHERE model_hash = ? AND image_hash = ?",
+                (time.time(), model_hash, image_hash)
+            )
+            self._conn.commit()
+        return np.frombuffer(row[0], dtype=np.float32).copy()
+
+    def put(self, model_hash, image_hash, probabilities):
+        """確率を保存し、上限を超えた分を古い順に削除"""
+        blob = np.asarray(probabilities, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                (model_hash, image_hash, blob, time.time())
+            )
+            self._conn.execute(
+                """DELETE FROM predictions WHERE rowid IN (
+                    SELECT rowid FROM predictions ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """キャッシュを全削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM predictions")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Teachable Machine モデルの TFLite 推論バックエンド
+keras_model.h5 を初回だけ TFLite に変換してキャッシュし、以降はインタプリタで推論する
+"""
+
+import os
+import time
+import threading
+import numpy as np
+
+from utils.prediction_cache import hash_file, hash_image_array
+
+DEFAULT_TFLITE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "vision-sys", "tflite"
+)
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+
+def _get_interpreter_class():
+    """tflite_runtime が無ければ TensorFlow 同梱のインタプリタを使う"""
+    if Interpreter is not None:
+        return Interpreter
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+def convert_to_tflite(keras_model, quantization='float16', representative_data=None):
+    """KerasモデルをTFLite形式（bytes）に変換
+
+    quantization:
+      float32 - 変換のみ
+      float16 - 重みをfloat16に量子化（サイズ約1/2）
+      int8    - representative_data があれば入出力も含めた整数量子化、
+                無ければ重みのみint8のダイナミックレンジ量子化
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"未対応の量子化方式です: {quantization}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if representative_data is not None and len(representative_data) > 0:
+            def representative_dataset():
+                for sample in representative_data:
+                    yield [np.asarray(sample, dtype=np.float32)[np.newaxis]]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+class TFLiteModel:
+    """TFLiteインタプリタを Keras モデルと同じ呼び方（predict / __call__）で使うラッパー"""
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self._interpreter = _get_interpreter_class()(
+            model_path=model_path, num_threads=num_threads
+        )
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # インタプリタはスレッドセーフではないため呼び出しを直列化する
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return tuple(int(d) for d in self._input['shape'][1:])
+
+    def _resize(self, batch_size):
+        """入力のバッチサイズが変わったときだけテンソルを確保し直す"""
+        if batch_size == self._batch_size:
+            return
+        shape = [batch_size, *self._input['shape'][1:]]
+        self._interpreter.resize_tensor_input(self._input['index'], shape)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def predict(self, batch, verbose=None):
+        """バッチ (N, H, W, 3) の0-1正規化画像からクラス確率 (N, C) を返す"""
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(batch.shape[0])
+            input_dtype = self._input['dtype']
+            if input_dtype in (np.int8, np.uint8):
+                scale, zero_point = self._input['quantization']
+                info = np.iinfo(input_dtype)
+                batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+            self._interpreter.set_tensor(self._input['index'], batch.astype(input_dtype))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output['index'])
+            if self._output['dtype'] in (np.int8, np.uint8):
+                scale, zero_point = self._output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+        return np.asarray(output, dtype=np.float32)
+
+    def __call__(self, batch, training=False):
+        return self.predict(batch)
+
+
+def load_tflite_model(model_path, quantization='float16', cache_dir=DEFAULT_TFLITE_CACHE_DIR,
+                      representative_data=None, num_threads=None):
+    """keras_model.h5 に対応するTFLiteモデルを読み込む（無ければ変換してキャッシュ）
+
+    キャッシュファイル名にはモデルファイルのハッシュを含めるため、
+    keras_model.h5 を差し替えると自動的に再変換される。
+    入出力も整数化する int8 は代表データ（キャリブレーション用の画像）のハッシュも含め、
+    別の画像で校正したモデルを使い回さない。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    suffix = quantization
+    if quantization == 'int8' and representative_data is not None and len(representative_data) > 0:
+        suffix = f"int8-full-{hash_image_array(representative_data)[:12]}"
+    tflite_path = os.path.join(cache_dir, f"{hash_file(model_path)[:16]}_{suffix}.tflite")
+
+    if not os.path.exists(tflite_path):
+        from tensorflow import keras
+        print(f"🔧 TFLite ({suffix}) に変換中: {model_path}")
+        keras_model = keras.models.load_model(model_path, compile=False)
+        content = convert_to_tflite(keras_model, quantization, representative_data)
+        # 書き込み途中のファイルを読まないよう、一時ファイルから置き換える
+        tmp_path = f"{tflite_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, tflite_path)
+        print(f"💾 変換済みモデルを保存: {tflite_path} "
+              f"({os.path.getsize(model_path) / 1e6:.1f}MB → {len(content) / 1e6:.1f}MB)")
+
+    return TFLiteModel(tflite_path, num_threads=num_threads)
+
+
+def compare_backends(reference_model, candidate_model, batches, labels, batch_size=32):
+    """2つのモデルの予測を比較し、精度差と速度のレポートを返す
+
+    batches: (N, H, W, 3) の0-1正規化画像のバッチを順に返すイテラブル
+        （全画像を1つの配列にしなくてよいよう、バッチごとに両方のモデルで推論して集計する）。
+        配列を1つ渡した場合は batch_size 枚ずつに分ける。
+    """
+    if isinstance(batches, np.ndarray):
+        batches = (batches[i:i + batch_size] for i in range(0, len(batches), batch_size))
+
+    models = (reference_model, candidate_model)
+    seconds = [0.0, 0.0]
+    samples, agreements, max_delta = 0, 0, 0.0
+    delta_sums = np.zeros(len(labels), dtype=np.float64)
+    for batch in batches:
+        batch = np.asarray(batch, dtype=np.float32)
+        if len(batch) == 0:
+            continue
+        if samples == 0:
+            # 初回呼び出しの初期化コストを除くため1回だけ空回しする
+            for model in models:
+                model(batch[:1], training=False)
+        outputs = []
+        for k, model in enumerate(models):
+            start = time.perf_counter()
+            outputs.append(np.asarray(model(batch, training=False)))
+            seconds[k] += time.perf_counter() - start
+
+        reference, candidate = outputs
+        delta = np.abs(reference - candidate)
+        samples += len(batch)
+        agreements += int((np.argmax(reference, axis=1) == np.argmax(candidate, axis=1)).sum())
+        max_delta = max(max_delta, float(delta.max()))
+        delta_sums += delta.sum(axis=0)
+
+    if samples == 0:
+        return None
+    return {
+        'samples': samples,
+        'top1_agreement': agreements / samples,
+        'disagreements': samples - agreements,
+        'max_abs_delta': max_delta,
+        'mean_abs_delta': float(delta_sums.sum() / (samples * len(labels))),
+        'per_class_mean_abs_delta': {
+            label: float(delta_sums[i] / samples) for i, label in enumerate(labels)
+        },
+        'reference_images_per_sec': samples / seconds[0] if seconds[0] > 0 else float('inf'),
+        'candidate_images_per_sec': samples / seconds[1] if seconds[1] > 0 else float('inf'),
+    }
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+高解像度画像のタイル分割推論
+画像全体を縮小すると消えてしまう小さな傷を見つけるため、重なりのあるタイルに分けて推論し、
+タイルごとの結果を1枚分の結果にまとめる
+"""
+
+import numpy as np
+
+
+def tile_positions(width, height, tile_size, overlap=0.25):
+    """画像全体を覆う、重なりのあるタイルの位置 (x1, y1, x2, y2) のリスト
+
+    overlap: 隣り合うタイルが重なる割合（0〜1未満）。タイルの境目にかかった傷も
+    どちらかのタイルに丸ごと入るようにする。右端・下端のタイルは画像の端に揃える。
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap は 0 以上 1 未満で指定してください")
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def merge_tile_scores(tile_probabilities, normal_index=None):
+    """タイルごとの確率 (T, C) を1枚分の確率 (C,) にまとめる（クラスごとの最大値）
+
+    normal_index（良品クラスの番号）を指定すると、良品クラスだけはタイルの最小値を使う。
+    1つのタイルでも不良と判定されれば、画像全体も不良寄りになる。
+    合計が1になるよう正規化した確率と、各クラスの値を出したタイルの番号を返す。
+    """
+    tile_probabilities = np.asarray(tile_probabilities)
+    pooled = tile_probabilities.max(axis=0)
+    source_tiles = tile_probabilities.argmax(axis=0)
+    if normal_index is not None:
+        pooled[normal_index] = tile_probabilities[:, normal_index].min()
+        source_tiles[normal_index] = tile_probabilities[:, normal_index].argmin()
+    total = pooled.sum()
+    if total > 0:
+        pooled = pooled / total
+    return pooled, source_tiles
+
+
+def nms(boxes, scores, iou_threshold=0.5):
+    """重なった枠のうち信頼度が最大のものだけを残す（Non-Maximum Suppression）
+
+    boxes: (N, 4) の x1, y1, x2, y2、scores: (N,)。残す枠の番号を信頼度の高い順に返す。
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = scores.argsort()[::-1]
+    keep = []
+    while len(order) > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0]), 0, None)
+        inter_h = np.clip(np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou < iou_threshold]
+    return np.array(keep, dtype=np.int64)
@@ -135,8 +135,39 @@ def visualize_feature_maps(image_path):
     plt.savefig(output_path, dpi=150, bbox_inches='tight')
     plt.show()
 
-def detect_person_yolo(image_path):
-    """YOLOによる人物検出"""
+# YOLOの検出結果を1件1行で持つ構造化配列の型（クラスID・信頼度・枠 x1, y1, x2, y2）
+DETECTION_DTYPE = np.dtype([
+    ('class_id', np.int16),
+    ('confidence', np.float32),
+    ('bbox', np.int32, (4,)),
+])
+
+def extract_detections(result, classes=(0,), conf_threshold=0.0):
+    """YOLOの推論結果から、指定クラスで信頼度が閾値を超える検出を構造化配列で取り出す
+
+    cls / conf / xyxy をそれぞれ1回だけnumpy配列に変換し、マスクでまとめて絞り込む。
+    classes=None なら全クラスを対象にする。
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros(0, dtype=DETECTION_DTYPE)
+    
+    class_ids = boxes.cls.cpu().numpy().astype(np.int16)
+    confidences = boxes.conf.cpu().numpy().astype(np.float32)
+    xyxy = boxes.xyxy.cpu().numpy()
+    
+    mask = confidences > conf_threshold
+    if classes is not None:
+        mask &= np.isin(class_ids, classes)
+    
+    detections = np.zeros(int(mask.sum()), dtype=DETECTION_DTYPE)
+    detections['class_id'] = class_ids[mask]
+    detections['confidence'] = confidences[mask]
+    detections['bbox'] = xyxy[mask].astype(np.int32)
+    return detections
+
+def detect_person_yolo(image_path, classes=(0,), conf_threshold=0.0):
+    """YOLOによる人物検出（classes=(0,) が人物。戻り値は検出結果の構造化配列）"""
     if not YOLO_AVAILABLE:
         print("\n⚠️ YOLOが利用できません。")
         return None
@@ -146,25 +177,20 @@ def detect_person_yolo(image_path):
     # YOLOモデルを読み込む
     model = YOLO('yolov8n.pt')
     
-    # 検出実行
-    results = model(image_path)
+    # 画像を読み込み、デコード済みの配列で検出実行
+    img = cv2.imread(image_path)
+    results = model(img)
     
     # 結果を描画
-    img = cv2.imread(image_path)
     img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     
-    person_count = 0
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            # クラスIDが0（人物）の場合のみ
-            if box.cls == 0:
-                person_count += 1
-                x1, y1, x2, y2 = box.xyxy[0]
-                cv2.rectangle(img_rgb, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                cv2.putText(img_rgb, f'Person {box.conf[0]:.2f}', 
-                           (int(x1), int(y1)-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    detections = np.concatenate([extract_detections(r, classes, conf_threshold) for r in results])
+    for (x1, y1, x2, y2), confidence in zip(detections['bbox'].tolist(), detections['confidence'].tolist()):
+        cv2.rectangle(img_rgb, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(img_rgb, f'Person {confidence:.2f}', 
+                   (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
     
+    person_count = len(detections)
     print(f"検出された人物: {person_count}人")
     
     # 結果を表示
@@ -177,7 +203,7 @@ def detect_person_yolo(image_path):
     plt.savefig(output_path, dpi=150, bbox_inches='tight')
     plt.show()
     
-    return person_count
+    return detections
 
 def detect_person_opencv(image_path):
     """OpenCVによる人物検出"""
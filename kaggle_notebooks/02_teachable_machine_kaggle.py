@@ -10,8 +10,6 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 from PIL import Image
-import tensorflow as tf
-from tensorflow import keras
 import pandas as pd
 from datetime import datetime
 
@@ -59,13 +57,12 @@ class TeachableMachineClassifier:
     def load_model(self, model_path, labels_path):
         """モデルとラベルを読み込む"""
         try:
+            # TensorFlowはモデルを読み込むときに初めてimportする
+            from tensorflow import keras
+            
             print(f"\n📦 モデルを読み込み中: {model_path}")
+            # 推論のみなので compile() は不要
             self.model = keras.models.load_model(model_path, compile=False)
-            self.model.compile(
-                optimizer='adam',
-                loss='categorical_crossentropy',
-                metrics=['accuracy']
-            )
             
             # ラベルを読み込む
             with open(labels_path, 'r', encoding='utf-8') as f: